@@ -1,17 +1,30 @@
 # backend/auth.py
 from __future__ import annotations
+import hashlib
+import heapq
+import json
 import os
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
-from typing import Any, Dict, Optional, Literal, Tuple
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Literal, Tuple
 
 import jwt
 from fastapi import HTTPException, Request
 
+from metrics import SESSION_DECODE
+from store import SharedGeneration
+
 # ==== Config ====
 SECRET_KEY = os.getenv("ARCHIVE_SECRET_KEY", "dev-only-change-me")
 ALGO = "HS256"
 SESSION_COOKIE = "archive_session"
 SESSION_TTL = timedelta(hours=8)
+SESSION_CACHE_SIZE = int(os.getenv("ARCHIVE_SESSION_CACHE_SIZE", "4096"))
+SESSION_CACHE_TTL = float(os.getenv("ARCHIVE_SESSION_CACHE_TTL", "300"))  # seconds
+REVOCATION_LOG_MAX = 1024 * 1024  # bytes before the shared log is rewritten with live entries
 
 Clearance = Literal["Minimal", "Restricted", "Operational", "TopSecret", "Redline"]
 
@@ -23,35 +36,240 @@ CLEARANCE_ORDER = {
     "Redline": 4,
 }
 
-def clearance_at_least(user: Dict[str, Any], required: Clearance) -> bool:
+# record 'classification' (spaces removed) -> required clearance
+CLASSIFICATION_CLEARANCE: Dict[str, Clearance] = {
+    "Minimal": "Minimal",
+    "Confidential": "Restricted",
+    "Restricted": "Restricted",
+    "Classified": "Operational",
+    "Operational": "Operational",
+    "TopSecret": "TopSecret",
+    "Top": "TopSecret",  # if someone wrote "Top Secret" split
+    "Redline": "Redline",
+}
+
+def clearance_level(user: Optional[Dict[str, Any]]) -> int:
+    """Numeric tier of a session/user (-1 = unknown clearance, sees nothing)."""
     u = (user or {}).get("clearance") or "Minimal"
-    return CLEARANCE_ORDER.get(str(u), -1) >= CLEARANCE_ORDER[required]
+    return CLEARANCE_ORDER.get(str(u), -1)
+
+def clearance_at_least(user: Dict[str, Any], required: Clearance) -> bool:
+    return clearance_level(user) >= CLEARANCE_ORDER[required]
 
 def make_session(user: Dict[str, Any]) -> str:
+    now = datetime.now(timezone.utc)
     payload = {
         "sub": user.get("id"),
         "username": user.get("username"),
         "clearance": user.get("clearance", "Minimal"),
-        "iat": datetime.now(timezone.utc),
-        "exp": datetime.now(timezone.utc) + SESSION_TTL,
+        # sub-second, so a login right after a revoke_subject() isn't caught by it
+        "iat": now.timestamp(),
+        "exp": now + SESSION_TTL,
     }
     return jwt.encode(payload, SECRET_KEY, algorithm=ALGO)
 
+# ==== Verified-session cache ====
+def _digest(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+class SessionCache:
+    """
+    Bounded LRU of verified JWT claims keyed by sha256(token), so an active
+    session costs a dict lookup instead of an HMAC verify + JSON parse.
+    Entries live until min(token exp, now + ttl).
+
+    Also holds the two ways a still-signed token stops being accepted:
+    - revoke(token): logout; remembered until the token would expire anyway
+      (however many there are: forgetting one early would let it back in)
+    - revoke_subject(sub): tokens for that agent issued up to now (e.g. before
+      a clearance change) are refused, so the next login carries fresh claims
+
+    After share() (multi-worker mode) both are also appended to a log that
+    every worker reads: a SharedGeneration counter tells them, with one memory
+    read per check, that there is something new to pick up.
+    """
+
+    def __init__(self, maxsize: int = SESSION_CACHE_SIZE, ttl: float = SESSION_CACHE_TTL) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._revoked: Dict[str, float] = {}  # digest -> exp
+        self._revoked_by_exp: List[Tuple[float, str]] = []  # heap, for pruning
+        self._not_before: Dict[str, float] = {}  # str(sub) -> epoch seconds
+        self._lock = threading.Lock()
+        self._shared: Optional[SharedGeneration] = None
+        self._log_path: Optional[Path] = None
+        self._log_at: Tuple[int, int] = (0, 0)  # (inode, bytes applied) of the shared log
+        self._log_gen = 0
+
+    # ---- multi-worker ----
+    def share(self, base: Path) -> None:
+        """Exchange revocations with the other workers through `<base>.revoked`."""
+        shared = SharedGeneration(base)
+        with self._lock:
+            self._shared = shared
+            self._log_path = base.with_suffix(".revoked")
+            self._read_log()
+
+    def _refresh(self) -> None:
+        shared = self._shared
+        if shared is not None and shared.value() != self._log_gen:
+            with self._lock:
+                self._read_log()
+
+    def _read_log(self) -> None:
+        """Apply log lines we haven't seen; call with self._lock held."""
+        self._log_gen = self._shared.value()  # before reading: a later append is seen next time
+        try:
+            f = self._log_path.open("rb")
+        except FileNotFoundError:
+            return
+        with f:
+            inode = os.fstat(f.fileno()).st_ino
+            offset = self._log_at[1] if self._log_at[0] == inode else 0  # rewritten: start over
+            f.seek(offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break  # still being appended
+                offset += len(line)
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if "token" in entry:
+                    self._add_revoked(str(entry["token"]), float(entry["exp"]))
+                elif "sub" in entry:
+                    self._add_not_before(str(entry["sub"]), float(entry["nbf"]))
+        self._log_at = (inode, offset)
+
+    def _publish(self, entry: Dict[str, Any]) -> None:
+        """Append one revocation for the other workers; call with self._lock held."""
+        if self._shared is None:
+            return
+        with self._shared.locked():
+            path = self._log_path
+            try:
+                size = path.stat().st_size
+            except FileNotFoundError:
+                size = 0
+            if size > REVOCATION_LOG_MAX:
+                self._read_log()
+                self._rewrite_log(path)  # entry is already applied locally, so it's included
+            else:
+                with path.open("ab") as f:
+                    f.write((json.dumps(entry, separators=(",", ":")) + "\n").encode("utf-8"))
+            self._shared.bump()
+
+    def _rewrite_log(self, path: Path) -> None:
+        # only what can still matter: unexpired tokens, not-before marks younger than a session
+        now = time.time()
+        lines = [{"token": d, "exp": exp} for d, exp in self._revoked.items() if exp > now]
+        lines += [{"sub": sub, "nbf": nbf} for sub, nbf in self._not_before.items()
+                  if nbf > now - SESSION_TTL.total_seconds()]
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        tmp.write_text("".join(json.dumps(e, separators=(",", ":")) + "\n" for e in lines), encoding="utf-8")
+        tmp.replace(path)
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self._lock:
+            item = self._items.get(digest)
+            if item is None or item[0] <= now:
+                if item is not None:
+                    del self._items[digest]
+                self.misses += 1
+                return None
+            self._items.move_to_end(digest)
+            self.hits += 1
+            return item[1]
+
+    def put(self, digest: str, claims: Dict[str, Any]) -> None:
+        deadline = min(float(claims.get("exp", 0)), time.time() + self.ttl)
+        with self._lock:
+            self._items[digest] = (deadline, claims)
+            self._items.move_to_end(digest)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+    def is_revoked(self, digest: str, claims: Dict[str, Any]) -> bool:
+        self._refresh()
+        if digest in self._revoked:
+            return True
+        nbf = self._not_before.get(str(claims.get("sub")))
+        return nbf is not None and float(claims.get("iat", 0)) <= nbf
+
+    def revoke(self, token: str, claims: Optional[Dict[str, Any]] = None) -> None:
+        digest = _digest(token)
+        now = time.time()
+        exp = float((claims or {}).get("exp", now + SESSION_TTL.total_seconds()))
+        with self._lock:
+            self._add_revoked(digest, exp)
+            self._publish({"token": digest, "exp": exp})
+
+    def revoke_subject(self, sub: Any) -> None:
+        nbf = time.time()
+        with self._lock:
+            self._add_not_before(str(sub), nbf)
+            self._publish({"sub": str(sub), "nbf": nbf})
+
+    def _add_revoked(self, digest: str, exp: float) -> None:
+        now = time.time()
+        self._items.pop(digest, None)
+        if exp <= now or self._revoked.get(digest) == exp:
+            return
+        self._revoked[digest] = exp
+        heapq.heappush(self._revoked_by_exp, (exp, digest))
+        # forget revocations for tokens that have expired by now
+        while self._revoked_by_exp and self._revoked_by_exp[0][0] <= now:
+            _, old = heapq.heappop(self._revoked_by_exp)
+            if self._revoked.get(old, now + 1) <= now:
+                del self._revoked[old]
+
+    def _add_not_before(self, sub: str, nbf: float) -> None:
+        if nbf <= self._not_before.get(sub, 0.0):
+            return
+        self._not_before[sub] = nbf
+        for digest in [d for d, (_, c) in self._items.items() if str(c.get("sub")) == sub]:
+            del self._items[digest]
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._items), "hits": self.hits, "misses": self.misses}
+
+SESSION_CACHE = SessionCache()
+
 def parse_session(token: str) -> Dict[str, Any]:
-    try:
-        return jwt.decode(token, SECRET_KEY, algorithms=[ALGO])
-    except jwt.ExpiredSignatureError:
-        raise HTTPException(401, detail="Session expired")
-    except jwt.InvalidTokenError:
-        raise HTTPException(401, detail="Invalid session")
+    start = time.perf_counter()
+    digest = _digest(token)
+    claims = SESSION_CACHE.get(digest)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGO])
+        except jwt.ExpiredSignatureError:
+            raise HTTPException(401, detail="Session expired")
+        except jwt.InvalidTokenError:
+            raise HTTPException(401, detail="Invalid session")
+        finally:
+            SESSION_DECODE.observe(time.perf_counter() - start, "false")
+        SESSION_CACHE.put(digest, claims)
+    else:
+        SESSION_DECODE.observe(time.perf_counter() - start, "true")
+    if SESSION_CACHE.is_revoked(digest, claims):
+        raise HTTPException(401, detail="Session revoked")
+    return dict(claims)
 
-def read_user_from_request(request: Request) -> Optional[Dict[str, Any]]:
+def token_from_request(request: Request) -> Optional[str]:
     token = request.cookies.get(SESSION_COOKIE)
     if not token:
         # Support Authorization: Bearer <token> for tooling/tests
         auth = request.headers.get("Authorization", "")
         if auth.lower().startswith("bearer "):
             token = auth[7:].strip()
+    return token or None
+
+def read_user_from_request(request: Request) -> Optional[Dict[str, Any]]:
+    token = token_from_request(request)
     if not token:
         return None
     return parse_session(token)
@@ -75,21 +293,10 @@ def record_required_clearance(record: Dict[str, Any]) -> Clearance:
     # (Intel) explicit classification present?
     cls = str(record.get("classification", "")).strip()
     if cls:
-        normalized = cls.replace(" ", "")
-        mapping = {
-            "Minimal": "Minimal",
-            "Confidential": "Restricted",
-            "Restricted": "Restricted",
-            "Classified": "Operational",
-            "Operational": "Operational",
-            "TopSecret": "TopSecret",
-            "Top": "TopSecret",  # if someone wrote "Top Secret" split
-            "Redline": "Redline",
-        }
         # special case "Top Secret" with space:
         if cls.lower() == "top secret":
             return "TopSecret"
-        return mapping.get(normalized, "Restricted")
+        return CLASSIFICATION_CLEARANCE.get(cls.replace(" ", ""), "Restricted")
 
     # (People) POI flag bumps to Restricted
     flags = [f.lower() for f in (record.get("internal_flags") or [])]
@@ -0,0 +1,101 @@
+"""
+All-or-nothing multi-collection writes for /api/batch.
+
+A Transaction holds the write lock of every collection it touches (always
+taken in the order given, so two batches can't deadlock) and hands out one
+StagedCollection per store. A staged view answers get()/in/next_id() like
+the store, including the batch's own earlier writes, but only records
+put()/delete() calls. Nothing reaches the store until commit(), and every
+collection is held in store.atomic(): an exception anywhere in the block,
+including one raised by an index while commit() applies the writes, takes
+back whatever was applied in every collection. After commit each
+collection's writes are made durable together when the locks are released:
+one group commit per collection.
+"""
+from __future__ import annotations
+
+from contextlib import ExitStack
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from store import Record, Store
+
+
+class StagedCollection:
+    """Store-shaped view over `store` plus this batch's pending writes."""
+
+    def __init__(self, store: Store) -> None:
+        self.store = store
+        self._over: Dict[str, Optional[Record]] = {}  # key -> record, or None if removed
+        self._entries: List[Tuple[str, Any, Optional[str]]] = []  # ("put", rec, slot) / ("del", key, None)
+
+    def key_of(self, record: Record) -> str:
+        return self.store.key_of(record)
+
+    def get(self, key: str) -> Optional[Record]:
+        if key in self._over:
+            return self._over[key]
+        return self.store.get(key)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def next_id(self) -> int:
+        # staged puts haven't raised the store's counter yet
+        n = self.store.next_id()
+        while str(n) in self._over:
+            n = self.store.next_id()
+        return n
+
+    def put(self, record: Record, key: Optional[str] = None) -> Optional[Record]:
+        new_key = self.key_of(record)
+        slot = new_key if key is None else key
+        old = self.get(slot)
+        if slot != new_key:
+            self._over[slot] = None
+        self._over[new_key] = record
+        self._entries.append(("put", record, slot))
+        return old
+
+    def delete(self, key: str) -> Optional[Record]:
+        old = self.get(key)
+        if old is None:
+            return None
+        self._over[key] = None
+        self._entries.append(("del", key, None))
+        return old
+
+    def _apply(self) -> None:
+        for op, value, slot in self._entries:
+            if op == "put":
+                self.store.put(value, key=slot)
+            else:
+                self.store.delete(value)
+
+
+class Transaction:
+    """`with Transaction([...stores]) as tx:` ... tx.view(store) ... tx.commit()"""
+
+    def __init__(self, stores: Iterable[Store]) -> None:
+        self._stores = list(dict.fromkeys(stores))
+        self._views = {id(s): StagedCollection(s) for s in self._stores}
+        self._stack = ExitStack()
+        self._committed = False
+
+    def __enter__(self) -> "Transaction":
+        for store in self._stores:
+            self._stack.enter_context(store.atomic())
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self._stack.__exit__(*exc)
+
+    def view(self, store: Store) -> StagedCollection:
+        return self._views[id(store)]
+
+    def commit(self) -> None:
+        """Apply every staged write in memory; durable once the block exits."""
+        if self._committed:
+            return
+        self._committed = True
+        for store in self._stores:
+            self._views[id(store)]._apply()
@@ -0,0 +1,12 @@
+"""
+Benchmarks for the archive API.
+
+    python -m bench.generate --people 10000 --out /tmp/archive   # synthetic data only
+    python -m bench.run --sizes 10000,100000 --concurrency 1,8 --out results.json
+    python -m bench.run ... --compare old-results.json
+
+Run from backend/. The generator is seeded, so the same arguments always
+produce the same archive; the driver serves the real app in-process (no
+network) against a generated copy in a temp directory and reports
+throughput and p50/p95/p99 latency per endpoint.
+"""
@@ -0,0 +1,154 @@
+"""
+Seeded synthetic archive: people, intel and agents shaped like
+PersonRecord / IntelRecord / AgentRecord in main.py.
+
+Names, aliases and gangs come from small pools so searches, associates and
+linked_persons hit real records the way they do in a live archive.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Dict, List
+
+FIRST = ["Ariel", "Kira", "Regina", "Marcus", "Dante", "Lena", "Viktor", "Sofia", "Jules", "Nico",
+         "Tessa", "Omar", "Priya", "Hugo", "Mara", "Silas", "Yuki", "Bruno", "Ines", "Kade"]
+LAST = ["Knight", "Wong", "Raine", "Cole", "Vega", "Petrov", "Mercer", "Okafor", "Lindqvist", "Reyes",
+        "Moreau", "Tanaka", "Blackwood", "Sato", "Novak", "Quinn", "Haddad", "Kowalski", "Duarte", "Frost"]
+ALIASES = ["Sakura", "Whitecat", "Zenith", "Doughy", "Monkeyman", "Ghost", "Viper", "Halo", "Rook",
+           "Cinder", "Static", "Mako", "Jinx", "Echo", "Nomad", "Raven", "Tinman", "Saint", "Bishop", "Lynx"]
+GANGS = ["Blue Sky", "Salamanca", "Night Market", "Iron Wolves", "Red Harbor", "Vagos", "Ballas", ""]
+NATIONALITIES = ["American", "Mexican", "Russian", "Japanese", "Nigerian", "Swedish", "French", "Brazilian"]
+FLAGS = ["Person of Interest", "High Priority", "Armed", "Informant", "Flight Risk"]
+MAKES = [("Annis", "RH4"), ("Pontiac", "Aztek"), ("Declasse", "Vigero"), ("Karin", "Sultan"), ("Bravado", "Buffalo")]
+CLASSIFICATIONS = ["Minimal", "Confidential", "Restricted", "Classified", "Operational", "TopSecret", "Redline"]
+STATUSES = ["Open", "Closed", "Pending", "Archived"]
+WORDS = ("meth lab shipment desert warehouse dock convoy informant wiretap surveillance cash drop "
+         "weapons cache border crossing safehouse courier ledger laundering casino port night market "
+         "burner phone frequency intercept rendezvous tunnel airstrip cartel contact handoff").split()
+CLEARANCES = ["Minimal", "Restricted", "Operational", "TopSecret", "Redline"]
+
+BENCH_PASSWORD = "bench"
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+
+
+def _when(rng: random.Random) -> str:
+    return (EPOCH + timedelta(seconds=rng.randrange(365 * 86400))).isoformat().replace("+00:00", "Z")
+
+def _plate(rng: random.Random) -> str:
+    return "".join(rng.choice("ABCDEFGHJKLMNPRSTUVWXYZ0123456789") for _ in range(rng.choice((7, 8))))
+
+def _sentence(rng: random.Random, n: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n)).capitalize() + "."
+
+
+def make_person(rng: random.Random, pid: int, names: List[str]) -> Dict[str, Any]:
+    full_name = f"{rng.choice(FIRST)} {rng.choice(LAST)}"
+    flags = rng.sample(FLAGS, k=rng.choice((0, 0, 0, 1, 1, 2)))
+    person: Dict[str, Any] = {
+        "id": pid,
+        "full_name": full_name,
+        "known_aliases": [f"{rng.choice(ALIASES)}{rng.randrange(100)}" for _ in range(rng.randrange(3))],
+        "dob": f"{rng.randrange(1950, 2005)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+        "gender": rng.choice(["Male", "Female", "Unknown"]),
+        "nationality": rng.choice(NATIONALITIES),
+        "current_address": f"{rng.randrange(1, 9999)} {rng.choice(LAST)} Ave",
+        "gang_affiliation": rng.choice(GANGS),
+        "known_associates": rng.sample(names, k=min(len(names), rng.randrange(5))),
+        "organization_ties": [],
+        "recent_contacts": [f"555{rng.randrange(10**7):07d}" for _ in range(rng.randrange(3))],
+        "suspected_informant": rng.choice(["", "", "Yes", "No"]),
+        "known_vehicles": [
+            {"make": make, "model": model, "color": rng.choice(["White", "Black", "Red"]), "plate": _plate(rng)}
+            for make, model in rng.sample(MAKES, k=rng.randrange(3))
+        ],
+        "tracked_devices": [f"IMEI{rng.randrange(10**14):014d}" for _ in range(rng.randrange(2))],
+        "radio_frequencies": [str(rng.choice((66, 67, 145.5, 446.0, 462.5625)))] if rng.random() < 0.3 else [],
+        "recent_movements": [],
+        "cctv_snapshots": [],
+        "intercepted_audio": [],
+        "blackmail_material": "",
+        "created_by": "bench",
+        "last_updated": _when(rng),
+        "access_level": rng.choice(["", "Restricted", "Classified"]),
+        "image_url": "",
+        "internal_flags": flags,
+        "linked_reports": [],
+    }
+    if "High Priority" in flags:
+        person["high_priority_at"] = person["last_updated"]
+    return person
+
+def make_intel(rng: random.Random, iid: int, names: List[str]) -> Dict[str, Any]:
+    return {
+        "id": iid,
+        "title": f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {rng.choice(WORDS)}",
+        "summary": " ".join(_sentence(rng, rng.randrange(8, 20)) for _ in range(rng.randrange(2, 6))),
+        "linked_persons": rng.sample(names, k=min(len(names), rng.randrange(4))),
+        "linked_reports": [],
+        "operation_code": f"OP-{rng.choice(WORDS).upper()}-{rng.randrange(100)}",
+        "status": rng.choice(STATUSES),
+        "source": f"CI-{rng.randrange(50)}",
+        "collection_method": rng.choice(["HUMINT", "SIGINT", "OSINT", "IMINT"]),
+        "classification": rng.choice(CLASSIFICATIONS),
+        "linked_organizations": [g for g in rng.sample(GANGS, k=2) if g],
+        "linked_operations": [],
+        "created_by": "bench",
+        "last_updated": _when(rng),
+        "internal_flags": ["High Priority"] if rng.random() < 0.05 else [],
+    }
+
+def make_agents(count: int) -> List[Dict[str, Any]]:
+    """agent0 is Redline; the rest cycle through the clearances. Password: BENCH_PASSWORD."""
+    agents = []
+    for i in range(count):
+        agents.append({
+            "id": f"{i + 1:03d}",
+            "name": f"Agent {i}",
+            "username": f"agent{i}",
+            "password": BENCH_PASSWORD,
+            "rank": "Agent",
+            "clearance": "Redline" if i == 0 else CLEARANCES[i % len(CLEARANCES)],
+            "createdBy": "bench",
+            "createdAt": EPOCH.isoformat().replace("+00:00", "Z"),
+            "lastActive": EPOCH.isoformat().replace("+00:00", "Z"),
+        })
+    return agents
+
+
+def generate(people: int, intel: int = 0, agents: int = 20, seed: int = 1) -> Dict[str, List[Dict[str, Any]]]:
+    """The whole archive; `intel` defaults to a quarter of `people`."""
+    rng = random.Random(seed)
+    intel = intel or max(1, people // 4)
+    pool = [f"{f} {l}" for f in FIRST for l in LAST] + [f"{a}{n}" for a in ALIASES for n in range(100)]
+    return {
+        "people": [make_person(rng, i + 1, pool) for i in range(people)],
+        "intel": [make_intel(rng, i + 1, pool) for i in range(intel)],
+        "agents": make_agents(agents),
+    }
+
+def write_archive(out: Path, data: Dict[str, List[Dict[str, Any]]]) -> None:
+    """Write the files main.py reads (point ARCHIVE_DATA_DIR at `out`)."""
+    out.mkdir(parents=True, exist_ok=True)
+    (out / "people.json").write_text(json.dumps(data["people"], ensure_ascii=False, indent=2), encoding="utf-8")
+    (out / "inteldata.json").write_text(json.dumps({"results": data["intel"]}, ensure_ascii=False, indent=2), encoding="utf-8")
+    (out / "agents.json").write_text(json.dumps(data["agents"], ensure_ascii=False, indent=2), encoding="utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Write a synthetic archive.")
+    parser.add_argument("--people", type=int, default=10000)
+    parser.add_argument("--intel", type=int, default=0, help="default: people / 4")
+    parser.add_argument("--agents", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args()
+    write_archive(args.out, generate(args.people, args.intel, args.agents, args.seed))
+    print(f"wrote {args.people} people to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
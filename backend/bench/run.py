@@ -0,0 +1,237 @@
+"""
+In-process load driver.
+
+For each dataset size a fresh synthetic archive is written to a temp
+directory (and migrated, with ARCHIVE_STORAGE=sqlite) and main.py is
+imported against it (ARCHIVE_DATA_DIR), then every scenario is driven
+through httpx's ASGI transport by `concurrency` async clients. Sync endpoints run in FastAPI's threadpool exactly as under
+uvicorn; only the socket is missing.
+
+Results are one row per (size, concurrency, endpoint) with throughput and
+latency percentiles; --out saves them as JSON and --compare prints the
+change against an earlier file.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from bench.generate import BENCH_PASSWORD, FIRST, LAST, generate, write_archive
+
+Scenario = Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+SCENARIOS = ("login", "list", "list_page", "search", "read", "update", "high_priority")
+
+
+def percentile(sorted_ms: List[float], p: float) -> float:
+    """Nearest-rank percentile of an ascending list."""
+    if not sorted_ms:
+        return 0.0
+    rank = max(1, min(len(sorted_ms), int(round(p / 100.0 * len(sorted_ms) + 0.5))))
+    return sorted_ms[rank - 1]
+
+
+def _scenarios(size: int, intel: int, agents: int, token: str) -> Dict[str, Scenario]:
+    auth = {"Authorization": f"Bearer {token}"}
+
+    async def login(c: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        response = await c.post("/api/login", json={"username": f"agent{rng.randrange(agents)}", "password": BENCH_PASSWORD})
+        c.cookies.clear()  # the other scenarios authenticate as agent0 via the header
+        return response
+
+    async def list_all(c: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        return await c.get("/api/all", headers=auth)
+
+    async def list_page(c: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        return await c.get("/api/all", params={"limit": 50, "sort": "-last_updated"}, headers=auth)
+
+    async def search(c: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        query = rng.choice((rng.choice(FIRST), rng.choice(LAST), rng.choice(LAST)[:2]))
+        return await c.post("/api/search", json={"query": query}, headers=auth)
+
+    async def read(c: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        return await c.get(f"/api/intel/{rng.randrange(1, intel + 1)}", headers=auth)
+
+    async def update(c: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        body = {"current_address": f"{rng.randrange(1, 9999)} Bench St"}
+        return await c.put(f"/api/update/{rng.randrange(1, size + 1)}", json=body, headers=auth)
+
+    async def high_priority(c: httpx.AsyncClient, rng: random.Random) -> httpx.Response:
+        return await c.get("/api/high-priority", params={"limit": 20}, headers=auth)
+
+    return {"login": login, "list": list_all, "list_page": list_page, "search": search,
+            "read": read, "update": update, "high_priority": high_priority}
+
+
+async def _drive(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int, seed: int) -> Dict[str, Any]:
+    latencies: List[float] = []
+    errors = 0
+    remaining = [requests]
+
+    async def worker(n: int) -> None:
+        nonlocal errors
+        rng = random.Random(seed * 1000 + n)
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            t0 = time.perf_counter()
+            response = await scenario(client, rng)
+            await response.aread()
+            latencies.append((time.perf_counter() - t0) * 1000.0)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / wall, 1) if wall else 0.0,
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+        "max_ms": round(latencies[-1], 3) if latencies else 0.0,
+    }
+
+
+def _load_app(data_dir: Path) -> Any:
+    """Import main.py against `data_dir` (a fresh module each time)."""
+    os.environ["ARCHIVE_DATA_DIR"] = str(data_dir)
+    if os.getenv("ARCHIVE_STORAGE", "json").strip().lower() == "sqlite":
+        from sqlite_store import default_db_path, migrate
+
+        os.environ.pop("ARCHIVE_DB", None)
+        migrate(default_db_path(data_dir), {
+            "agents": data_dir / "agents.json",
+            "people": data_dir / "people.json",
+            "intel": data_dir / "inteldata.json",
+        })
+    sys.modules.pop("main", None)
+    return importlib.import_module("main")
+
+
+async def _bench_size(
+    size: int,
+    concurrency: List[int],
+    scenarios: List[str],
+    requests: int,
+    seed: int,
+    log: Callable[[str], None],
+) -> List[Dict[str, Any]]:
+    data = generate(size, seed=seed)
+    intel, agents = len(data["intel"]), len(data["agents"])
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="archive-bench-") as tmp:
+        write_archive(Path(tmp), data)
+        del data
+        t0 = time.perf_counter()
+        app_module = _load_app(Path(tmp))
+        app_module.PEOPLE.records(), app_module.INTEL.records(), app_module.AGENTS.records()
+        log(f"size={size}: loaded in {time.perf_counter() - t0:.2f}s")
+        transport = httpx.ASGITransport(app=app_module.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            login = await client.post("/api/login", json={"username": "agent0", "password": BENCH_PASSWORD})
+            login.raise_for_status()
+            client.cookies.clear()
+            table = _scenarios(size, intel, agents, login.json()["token"])
+            for c in concurrency:
+                for name in scenarios:
+                    # a short warm-up so lazy index builds don't land in the numbers
+                    await _drive(client, table[name], min(10, requests), 1, seed)
+                    stats = await _drive(client, table[name], requests, c, seed)
+                    row = {"size": size, "concurrency": c, "endpoint": name, **stats}
+                    rows.append(row)
+                    log(f"  c={c:<3} {name:<14} {stats['rps']:>9} req/s  p50 {stats['p50_ms']:>8} ms"
+                        f"  p95 {stats['p95_ms']:>8} ms  p99 {stats['p99_ms']:>8} ms  errors {stats['errors']}")
+        app_module.ACTIVITY.stop()
+    return rows
+
+
+def _git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=Path(__file__).resolve().parent, timeout=5)
+        return out.stdout.strip() or None
+    except Exception:
+        return None
+
+def run(sizes: List[int], concurrency: List[int], scenarios: List[str], requests: int, seed: int,
+        log: Callable[[str], None] = print) -> Dict[str, Any]:
+    rows: List[Dict[str, Any]] = []
+    for size in sizes:
+        rows.extend(asyncio.run(_bench_size(size, concurrency, scenarios, requests, seed, log)))
+    return {
+        "meta": {
+            "revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "storage": os.getenv("ARCHIVE_STORAGE", "json"),
+            "seed": seed,
+            "requests": requests,
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": rows,
+    }
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]) -> List[str]:
+    """One line per row present in both: throughput and p95 change."""
+    def key(row: Dict[str, Any]) -> Tuple[int, int, str]:
+        return (row["size"], row["concurrency"], row["endpoint"])
+    before = {key(r): r for r in old.get("results", [])}
+    lines = []
+    for row in new["results"]:
+        prev = before.get(key(row))
+        if prev is None:
+            continue
+        rps = (row["rps"] / prev["rps"] - 1) * 100 if prev["rps"] else 0.0
+        p95 = (row["p95_ms"] / prev["p95_ms"] - 1) * 100 if prev["p95_ms"] else 0.0
+        lines.append(f"size={row['size']:<7} c={row['concurrency']:<3} {row['endpoint']:<14}"
+                     f" req/s {rps:+7.1f}%   p95 {p95:+7.1f}%")
+    return lines
+
+
+def _ints(text: str) -> List[int]:
+    return [int(x) for x in text.split(",") if x.strip()]
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the archive API in-process.")
+    parser.add_argument("--sizes", type=_ints, default=[1000, 10000], help="people per dataset, comma-separated")
+    parser.add_argument("--concurrency", type=_ints, default=[1, 8], help="concurrent clients, comma-separated")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"subset of {','.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint per run")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", type=Path, help="write results JSON here")
+    parser.add_argument("--compare", type=Path, help="earlier results JSON to diff against")
+    args = parser.parse_args()
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenarios: {', '.join(sorted(unknown))}")
+    # flush lastActive on the default schedule rather than per login
+    os.environ.setdefault("ARCHIVE_ACTIVITY_FLUSH", "30")
+    results = run(args.sizes, args.concurrency, scenarios, args.requests, args.seed)
+    if args.out:
+        args.out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"results -> {args.out}")
+    if args.compare:
+        for line in compare(json.loads(args.compare.read_text(encoding="utf-8")), results):
+            print(line)
+
+
+if __name__ == "__main__":
+    main()
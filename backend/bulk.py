@@ -0,0 +1,121 @@
+"""
+Bulk NDJSON import/export for /api/import/{collection} and /api/export/{collection}.
+
+Import spools the request body as it arrives (in memory up to a point, then
+to a temp file), then reads it back one line at a time: each line is parsed,
+validated, given an id and written before the next is read, all inside a
+single store.atomic() block, so the whole import costs one durable write (one
+journal append + fsync, or one SQLite transaction) instead of one per record.
+Bad lines, including ones an index refuses, are skipped and reported by line
+number; the rest still go in.
+
+Export streams the caller-visible records as NDJSON (or {"results": [...]}
+JSON) straight from the working set, in chunks, without rendering the
+collection as one string.
+"""
+from __future__ import annotations
+
+import json
+import tempfile
+from typing import IO, Any, AsyncIterator, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from fastapi import HTTPException
+
+from store import Record, Store
+
+IMPORT_MODES = ("create", "upsert")
+_CHUNK = 64 * 1024
+_SPOOL_IN_MEMORY = 4 * 1024 * 1024  # larger bodies go to a temp file
+
+Row = Tuple[int, Union[Any, ValueError]]  # (line number, parsed value or parse error)
+
+
+def _parse(line: bytes) -> Union[Any, ValueError]:
+    try:
+        return json.loads(line)
+    except ValueError as exc:
+        return ValueError(f"invalid JSON: {exc}")
+
+async def spool_body(chunks: AsyncIterator[bytes]) -> IO[bytes]:
+    """The request body as a file, rewound; close it when done."""
+    f = tempfile.SpooledTemporaryFile(max_size=_SPOOL_IN_MEMORY)
+    try:
+        async for chunk in chunks:
+            f.write(chunk)
+    except BaseException:
+        f.close()
+        raise
+    f.seek(0)
+    return f
+
+def read_ndjson(f: IO[bytes]) -> Iterator[Row]:
+    """Every non-blank line of `f`, parsed one at a time."""
+    for lineno, line in enumerate(f, 1):
+        if line.strip():
+            yield lineno, _parse(line)
+
+
+def import_records(
+    store: Store,
+    rows: Iterable[Row],
+    prepare: Callable[[Dict[str, Any]], Record],
+    mode: str = "create",
+    replaced: Optional[Callable[[Record, Record], None]] = None,
+) -> Dict[str, Any]:
+    """
+    Validate and write `rows` in one commit. `prepare(obj)` fills defaults and
+    assigns an id (raising HTTPException for bad input); in "create" mode an
+    id that already exists is an error, in "upsert" mode it is replaced.
+    `replaced(old, new)` runs for each replaced record once the commit is in.
+    """
+    if mode not in IMPORT_MODES:
+        raise HTTPException(400, detail=f"mode must be one of: {', '.join(IMPORT_MODES)}")
+    report: Dict[str, Any] = {"created": 0, "updated": 0, "errors": []}
+    seen = set()
+    updates: List[Tuple[Record, Record]] = []
+    with store.atomic():
+        for lineno, value in rows:
+            try:
+                if isinstance(value, ValueError):
+                    raise value
+                if not isinstance(value, dict):
+                    raise ValueError("expected a JSON object")
+                rec = prepare(dict(value))
+                key = store.key_of(rec)
+                if key in seen:
+                    raise ValueError(f"id {rec.get('id')} appears earlier in this import")
+                old = store.get(key)
+                exists = old is not None
+                if exists and mode == "create":
+                    raise ValueError(f"id {rec.get('id')} already exists")
+                # a put an index refuses leaves nothing behind (see Store._apply_live)
+                store.put(rec)
+            except HTTPException as exc:
+                report["errors"].append({"line": lineno, "error": str(exc.detail)})
+                continue
+            except Exception as exc:
+                report["errors"].append({"line": lineno, "error": str(exc)})
+                continue
+            seen.add(key)
+            report["updated" if exists else "created"] += 1
+            if exists:
+                updates.append((old, rec))
+    if replaced is not None:
+        for old, rec in updates:
+            replaced(old, rec)
+    return report
+
+
+def stream_ndjson(records: Iterable[Record]) -> Iterator[bytes]:
+    """One JSON document per line, yielded in ~64 KiB chunks."""
+    buf: List[str] = []
+    size = 0
+    for rec in records:
+        line = json.dumps(rec, ensure_ascii=False) + "\n"
+        buf.append(line)
+        size += len(line)
+        if size >= _CHUNK:
+            yield "".join(buf).encode("utf-8")
+            buf, size = [], 0
+    if buf:
+        yield "".join(buf).encode("utf-8")
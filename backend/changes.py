@@ -0,0 +1,211 @@
+"""
+Push change feed for /api/events (Server-Sent Events).
+
+ChangeEmitter is attached to a store like any other index, so every write
+(create, update, delete, priority flag) becomes an event no matter which
+handler made it; writes replayed from other workers show up too. Events go
+into one ChangeFeed: a ring buffer of the last ARCHIVE_EVENT_BUFFER events
+with ids of the form "<epoch>-<seq>". A client reconnecting with
+Last-Event-ID gets what it missed from the buffer; if that has already been
+overwritten (or the server restarted) it gets a "reset" event and should
+refetch. The buffer and its ids are per process: under `--workers N` a
+stream stays on one worker, and a reconnect to another one resets.
+
+Each event carries the clearance tier its record needs before and after the
+change, so filtering per subscriber is an integer comparison. An update that
+takes a record out of the caller's view is delivered as a delete.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import os
+import threading
+from collections import deque
+from typing import Any, AsyncIterator, Awaitable, Callable, Deque, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from auth import CLEARANCE_ORDER, clearance_level, record_required_clearance
+from store import Index, Record
+
+EVENT_BUFFER = int(os.getenv("ARCHIVE_EVENT_BUFFER", "1024"))
+KEEPALIVE_SECONDS = 15.0
+
+Event = Dict[str, Any]
+_HIDDEN = len(CLEARANCE_ORDER)  # tier of "no record": nobody sees it
+
+
+class ChangeFeed:
+    """Ring buffer of recent change events plus wake-ups for async subscribers."""
+
+    def __init__(self, size: int = EVENT_BUFFER) -> None:
+        self.epoch = os.urandom(4).hex()
+        self._events: Deque[Event] = deque(maxlen=size)
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._waiters: Set[Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = set()
+
+    def publish(self, event: Event) -> None:
+        with self._lock:
+            self._seq += 1
+            event["seq"] = self._seq
+            self._events.append(event)
+            waiters = list(self._waiters)
+        for loop, flag in waiters:
+            try:
+                loop.call_soon_threadsafe(flag.set)
+            except RuntimeError:
+                pass  # loop already closed; unsubscribe() is on its way
+
+    def event_id(self, event: Event) -> str:
+        return f"{self.epoch}-{event['seq']}"
+
+    def since(self, last_id: str) -> Optional[List[Event]]:
+        """Events after `last_id`; None if it can't be resumed from the buffer."""
+        with self._lock:
+            events = list(self._events)
+            seq = self._seq
+        epoch, _, n = last_id.partition("-")
+        if epoch != self.epoch or not n.isdigit() or int(n) > seq:
+            return None
+        after = int(n)
+        if events and events[0]["seq"] > after + 1:
+            return None  # overwritten in the ring
+        return [e for e in events if e["seq"] > after]
+
+    def latest_id(self) -> str:
+        with self._lock:
+            return f"{self.epoch}-{self._seq}"
+
+    # ---- subscriber wake-ups ----
+    def subscribe(self) -> asyncio.Event:
+        flag = asyncio.Event()
+        with self._lock:
+            self._waiters.add((asyncio.get_running_loop(), flag))
+        return flag
+
+    def unsubscribe(self, flag: asyncio.Event) -> None:
+        with self._lock:
+            self._waiters = {w for w in self._waiters if w[1] is not flag}
+
+    def subscribers(self) -> int:
+        return len(self._waiters)
+
+
+class ChangeEmitter(Index):
+    """
+    Publishes one collection's writes to a ChangeFeed.
+    `tier(record)` is the clearance level needed to see it; `flagged(record)`
+    tells priority changes apart; `public(record)` is what subscribers get.
+    """
+
+    observer = True
+
+    def __init__(
+        self,
+        feed: ChangeFeed,
+        collection: str,
+        tier: Optional[Callable[[Record], int]] = None,
+        flagged: Optional[Callable[[Record], bool]] = None,
+        public: Optional[Callable[[Record], Record]] = None,
+    ) -> None:
+        self.feed = feed
+        self.collection = collection
+        self._tier = tier or (lambda rec: CLEARANCE_ORDER[record_required_clearance(rec)])
+        self._flagged = flagged
+        self._public = public or (lambda rec: rec)
+        self._loaded = False
+
+    def rebuild(self, records: List[Record]) -> None:
+        # a reload after the first load means we can't say what changed
+        if self._loaded:
+            self.feed.publish({"collection": self.collection, "type": "reset", "tier": 0, "old_tier": 0})
+        self._loaded = True
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        if new is None:
+            kind = "delete"
+        elif old is None:
+            kind = "create"
+        elif self._flagged is not None and self._flagged(old) != self._flagged(new):
+            kind = "priority"
+        else:
+            kind = "update"
+        self.feed.publish({
+            "collection": self.collection,
+            "type": kind,
+            "id": (new or old).get("id"),
+            "old_id": old.get("id") if old is not None else None,
+            "tier": self._tier(new) if new is not None else _HIDDEN,
+            "old_tier": self._tier(old) if old is not None else _HIDDEN,
+            "record": self._public(new) if new is not None else None,
+        })
+
+
+# ========= Per-subscriber view =========
+def view_event(event: Event, level: int) -> Optional[Dict[str, Any]]:
+    """What a caller at clearance `level` may see of `event` (None: nothing)."""
+    sees_new = event["tier"] <= level
+    sees_old = event["old_tier"] <= level
+    kind = event["type"]
+    if kind == "reset":
+        return {"collection": event["collection"], "type": "reset"}
+    if sees_new:
+        out = {"collection": event["collection"], "type": kind, "id": event["id"], "record": event["record"]}
+        if event["old_id"] is not None and event["old_id"] != event["id"]:
+            out["old_id"] = event["old_id"]
+        return out
+    if sees_old:
+        # deleted, or no longer visible to this caller
+        return {"collection": event["collection"], "type": "delete", "id": event["old_id"]}
+    return None
+
+def format_sse(event_id: str, kind: str, data: Dict[str, Any]) -> bytes:
+    payload = json.dumps(data, ensure_ascii=False, separators=(",", ":"))
+    return f"id: {event_id}\nevent: {kind}\ndata: {payload}\n\n".encode("utf-8")
+
+
+async def stream_events(
+    feed: ChangeFeed,
+    last_id: Optional[str],
+    current_user: Callable[[], Optional[Dict[str, Any]]],
+    is_disconnected: Callable[[], Awaitable[bool]],
+) -> AsyncIterator[bytes]:
+    """
+    SSE body: replay from `last_id`, then follow the feed. `current_user()` is
+    re-checked on every wake-up so a revoked or downgraded session stops (or
+    narrows) the stream; a session that expired or was revoked (None, or a
+    401 from `current_user()`) ends the stream cleanly.
+    """
+    flag = feed.subscribe()
+    try:
+        yield b"retry: 3000\n\n"
+        cursor = last_id if last_id is not None else feed.latest_id()
+        while True:
+            flag.clear()
+            try:
+                user = current_user()
+            except HTTPException:
+                return
+            if user is None:
+                return
+            level = clearance_level(user)
+            events = feed.since(cursor)
+            if events is None:
+                cursor = feed.latest_id()
+                yield format_sse(cursor, "reset", {"type": "reset"})
+                continue
+            for event in events:
+                cursor = feed.event_id(event)
+                data = view_event(event, level)
+                if data is not None:
+                    yield format_sse(cursor, data["type"], data)
+            try:
+                await asyncio.wait_for(flag.wait(), timeout=KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await is_disconnected():
+                    return
+                yield b": keepalive\n\n"
+    finally:
+        feed.unsubscribe(flag)
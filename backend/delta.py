@@ -0,0 +1,155 @@
+"""
+Delta sync for /api/changes.
+
+ChangeLog keeps one collection's records ordered by modification sequence:
+every put moves the record to the end with a new sequence number, and a
+delete (or the old id of a rename) leaves a tombstone in its place. A client
+that remembers the sequence it last saw gets back only what changed after
+it, deletes included, instead of the whole collection.
+
+A cursor can't be served incrementally when it comes from another process
+lifetime (epoch mismatch), predates a full reload, or predates a tombstone
+that was evicted (at most ARCHIVE_TOMBSTONES are kept). Then the answer is a
+"reset": the complete visible collection, to replace the local copy.
+
+In multi-worker mode positions are the store's shared generation instead of
+a per-process counter, so a cursor from one worker is good at every other.
+An entry is numbered with the generation its commit gets, or an upper bound
+of it for writes replayed from another worker: a change may be sent twice,
+never skipped. Only cursors from before a worker's last (re)load reset.
+
+Clearance: each entry remembers the tier its record needs now and the lowest
+tier it needed since it entered the log. A record the caller can't see now is
+reported as deleted only if it may have been visible to them before, so
+hidden records are never revealed.
+"""
+from __future__ import annotations
+
+import base64
+import json
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from auth import CLEARANCE_ORDER, record_required_clearance
+from store import Index, Record
+
+TOMBSTONE_LIMIT = int(os.getenv("ARCHIVE_TOMBSTONES", "10000"))
+_HIDDEN = len(CLEARANCE_ORDER)
+
+Position = Tuple[str, int]  # (epoch, seq); ("g", generation) in multi-worker mode
+
+
+class _Entry:
+    __slots__ = ("seq", "tier", "low_tier", "record", "id")
+
+    def __init__(self, seq: int, tier: int, low_tier: int, record: Optional[Record], rid: Any) -> None:
+        self.seq = seq
+        self.tier = tier
+        self.low_tier = low_tier
+        self.record = record  # None for a tombstone
+        self.id = rid
+
+
+class ChangeLog(Index):
+    """key -> latest entry, kept in modification order."""
+
+    observer = True
+
+    def __init__(self, tier: Optional[Callable[[Record], int]] = None, max_tombstones: int = TOMBSTONE_LIMIT) -> None:
+        self.epoch = os.urandom(4).hex()
+        self._tier = tier or (lambda rec: CLEARANCE_ORDER[record_required_clearance(rec)])
+        self._max_tombstones = max_tombstones
+        self._log: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._tombstones: Deque[Tuple[int, str]] = deque()
+        self._seq = 0
+        self._floor = 0  # cursors below this need a reset
+        self._lock = threading.Lock()
+
+    # ---- maintenance ----
+    def rebuild(self, records: List[Record]) -> None:
+        with self._lock:
+            self._log.clear()
+            self._tombstones.clear()
+            # no way to tell what a reload changed; a shared generation already
+            # counts every commit the load contains
+            generation = self.store.generation()
+            self._floor = self._seq = self._seq + 1 if generation is None else generation
+            for rec in records:
+                self._touch(self.store.key_of(rec), rec)
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        with self._lock:
+            # a shared generation only moves at the commit: this is the one it will get
+            generation = self.store.generation()
+            self._seq = (self._seq if generation is None else generation) + 1
+            if old is not None:
+                old_key = self.store.key_of(old)
+                if new is None or self.store.key_of(new) != old_key:
+                    self._touch(old_key, None, old.get("id"))
+            if new is not None:
+                self._touch(self.store.key_of(new), new)
+            self._evict()
+
+    def _touch(self, key: str, rec: Optional[Record], rid: Any = None) -> None:
+        prev = self._log.pop(key, None)
+        tier = self._tier(rec) if rec is not None else _HIDDEN
+        low = min(tier, prev.low_tier) if prev is not None else tier
+        self._log[key] = _Entry(self._seq, tier, low, rec, rec.get("id") if rec is not None else rid)
+        if rec is None:
+            self._tombstones.append((self._seq, key))
+
+    def _evict(self) -> None:
+        while len(self._tombstones) > self._max_tombstones:
+            seq, key = self._tombstones.popleft()
+            entry = self._log.get(key)
+            if entry is not None and entry.seq == seq:
+                del self._log[key]
+                self._floor = max(self._floor, seq)
+
+    # ---- queries ----
+    def delta(self, since: Optional[Position], level: int) -> Tuple[Dict[str, Any], Position]:
+        """
+        ({"reset": bool, "changes": [...]}, new position) for a caller at
+        clearance `level`. Changes are {"id", "record"} or {"id", "deleted": true},
+        oldest first.
+        """
+        # read before catching up: every commit up to it is applied after _sync()
+        generation = self.store.generation()
+        self._sync()
+        with self._lock:
+            position = (self.epoch, self._seq) if generation is None else ("g", generation)
+            reset = since is None or since[0] != position[0] or since[1] < self._floor or since[1] > position[1]
+            if reset:
+                entries = [e for e in self._log.values() if e.record is not None]
+            else:
+                entries = []
+                for e in reversed(self._log.values()):
+                    if e.seq <= since[1]:
+                        break
+                    entries.append(e)
+                entries.reverse()
+        changes: List[Dict[str, Any]] = []
+        for e in entries:
+            if e.record is not None and e.tier <= level:
+                changes.append({"id": e.id, "record": e.record})
+            elif not reset and e.low_tier <= level:
+                changes.append({"id": e.id, "deleted": True})
+        return {"reset": reset, "changes": changes}, position
+
+
+# ========= Cursors =========
+def encode_since(positions: Dict[str, Position]) -> str:
+    raw = json.dumps({name: [epoch, seq] for name, (epoch, seq) in positions.items()}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_since(since: str) -> Dict[str, Position]:
+    try:
+        padded = since + "=" * (-len(since) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        return {str(name): (str(pos[0]), int(pos[1])) for name, pos in data.items()}
+    except Exception:
+        raise HTTPException(400, detail="Invalid since cursor")
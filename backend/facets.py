@@ -0,0 +1,146 @@
+"""
+Structured filters and facet counts for the list endpoints.
+
+FacetIndex keeps, for each faceted field, value -> set of record keys
+(a record with a list field is posted under every element). Values match
+case-insensitively and with surrounding whitespace ignored; the spelling
+shown in facet counts is the most recently written one.
+
+Filtering is set algebra over the postings: values of one field are OR'ed,
+fields are AND'ed, smallest set first. Facet counts are posting sizes
+intersected with the caller's visible (and already filtered) keys, so
+neither touches a record.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Sequence, Set
+
+from fastapi import HTTPException
+
+from store import Index, Record
+
+FACET_TOP = 50  # values per field in a facet response, by default
+
+
+def fold_value(value: Any) -> str:
+    return " ".join(str(value).split()).lower()
+
+def _values(rec: Record, field: str) -> Set[str]:
+    raw = rec.get(field)
+    if raw is None:
+        return set()
+    items = raw if isinstance(raw, list) else [raw]
+    return {str(v).strip() for v in items if not isinstance(v, (dict, list)) and str(v).strip()}
+
+
+class FacetIndex(Index):
+    """field -> folded value -> keys, for a fixed set of fields."""
+
+    def __init__(self, fields: Sequence[str]) -> None:
+        self.fields = list(fields)
+        self._clear()
+
+    def _clear(self) -> None:
+        self._postings: Dict[str, Dict[str, Set[str]]] = {f: {} for f in self.fields}
+        self._display: Dict[str, Dict[str, str]] = {f: {} for f in self.fields}
+        self._keys: Set[str] = set()
+
+    # ---- maintenance ----
+    def rebuild(self, records: List[Record]) -> None:
+        self._clear()
+        for rec in records:
+            self._add(rec)
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        if old is not None:
+            self._remove(old)
+        if new is not None:
+            self._add(new)
+
+    def _add(self, rec: Record) -> None:
+        key = self.store.key_of(rec)
+        self._keys.add(key)
+        for field in self.fields:
+            for value in _values(rec, field):
+                folded = fold_value(value)
+                self._postings[field].setdefault(folded, set()).add(key)
+                self._display[field][folded] = value
+
+    def _remove(self, rec: Record) -> None:
+        key = self.store.key_of(rec)
+        self._keys.discard(key)
+        for field in self.fields:
+            postings = self._postings[field]
+            for value in _values(rec, field):
+                folded = fold_value(value)
+                keys = postings.get(folded)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del postings[folded]
+                        self._display[field].pop(folded, None)
+
+    # ---- queries ----
+    def parse(self, params: Any) -> Dict[str, List[str]]:
+        """Faceted fields among the query params (repeatable): field -> accepted values."""
+        return {f: params.getlist(f) for f in self.fields if params.getlist(f)}
+
+    def matching(self, criteria: Mapping[str, Iterable[str]]) -> Optional[Set[str]]:
+        """
+        Keys of records matching every field's criteria (any listed value per
+        field); None when there are no criteria, meaning "everything".
+        """
+        if not criteria:
+            return None
+        self._sync()
+        per_field: List[Set[str]] = []
+        for field, values in criteria.items():
+            postings = self._postings.get(field)
+            if postings is None:
+                raise HTTPException(400, detail=f"Cannot filter on {field}; use one of: {', '.join(self.fields)}")
+            hits = [postings.get(fold_value(v), set()) for v in values]
+            per_field.append(hits[0] if len(hits) == 1 else set().union(*hits))
+        per_field.sort(key=len)
+        out = set(per_field[0])
+        for keys in per_field[1:]:
+            if not out:
+                break
+            out &= keys
+        return out
+
+    def counts(
+        self,
+        within: Optional[Set[str]],
+        fields: Optional[Sequence[str]] = None,
+        top: int = FACET_TOP,
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """
+        {field: [{"value", "count"}, ...]} over the keys in `within` (all
+        records if None), most frequent first, at most `top` values per field.
+        """
+        self._sync()
+        fields = list(fields) if fields else self.fields
+        for field in fields:
+            if field not in self._postings:
+                raise HTTPException(400, detail=f"No facet for {field}; use one of: {', '.join(self.fields)}")
+        out: Dict[str, List[Dict[str, Any]]] = {}
+        for field in fields:
+            display = self._display[field]
+            tally = []
+            # writers change the postings meanwhile: list() copies them in one C call
+            for folded, keys in list(self._postings[field].items()):
+                n = len(keys) if within is None else _overlap(keys, within)
+                if n:
+                    tally.append((-n, display.get(folded, folded)))
+            tally.sort()
+            out[field] = [{"value": value, "count": -n} for n, value in tally[:top]]
+        return out
+
+    def total(self, within: Optional[Set[str]]) -> int:
+        return len(self._keys) if within is None else _overlap(self._keys, within)
+
+
+def _overlap(a: Set[str], b: Set[str]) -> int:
+    # a C-level intersection: both sets may be live, and a Python loop over one
+    # could see it change size
+    return len(a & b)
@@ -0,0 +1,87 @@
+"""
+Materialized high-priority feed.
+
+FeedIndex keeps one collection's flagged records as ready-made feed items,
+ordered by their flaggedAt timestamp. The store updates it on every write, so
+flagging, unflagging, or editing internal_flags through any endpoint is
+reflected immediately. Reading the newest N items (optionally only those
+newer than `since`) walks N entries from the end instead of the archive.
+"""
+from __future__ import annotations
+
+import heapq
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from store import Index, Record
+
+FeedItem = Dict[str, Any]
+_KEY_MAX = chr(0x10FFFF)
+
+
+class FeedIndex(Index):
+    """`item(record)` builds the feed entry, or returns None if the record isn't flagged."""
+
+    def __init__(self, item: Callable[[Record], Optional[FeedItem]]) -> None:
+        self._item = item
+        self._items: Dict[str, FeedItem] = {}
+        self._entries: List[Tuple[str, str]] = []  # (flaggedAt, key), ascending
+
+    def rebuild(self, records: List[Record]) -> None:
+        self._items = {}
+        for rec in records:
+            item = self._item(rec)
+            if item is not None:
+                self._items[self.store.key_of(rec)] = item
+        self._entries = sorted((item["flaggedAt"], key) for key, item in self._items.items())
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        if old is not None:
+            key = self.store.key_of(old)
+            item = self._items.pop(key, None)
+            if item is not None:
+                entry = (item["flaggedAt"], key)
+                i = bisect_left(self._entries, entry)
+                if i < len(self._entries) and self._entries[i] == entry:
+                    del self._entries[i]
+        if new is not None:
+            item = self._item(new)
+            if item is not None:
+                key = self.store.key_of(new)
+                self._items[key] = item
+                insort(self._entries, (item["flaggedAt"], key))
+
+    def newest(self, since: Optional[str] = None) -> Iterator[Tuple[str, FeedItem]]:
+        """(key, item) newest first, stopping at items flagged at or before `since`."""
+        self._sync()
+        entries = self._entries
+        stop = 0 if since is None else bisect_right(entries, (since, _KEY_MAX))
+        i = len(entries) - 1
+        while i >= stop:
+            if i < len(entries):
+                flagged_at, key = entries[i]
+                item = self._items.get(key)
+                if item is not None:
+                    yield key, item
+            i -= 1
+
+
+def merge_newest(
+    streams: Iterable[Tuple[Iterator[Tuple[str, FeedItem]], Callable[[str], bool]]],
+    limit: Optional[int] = None,
+) -> List[FeedItem]:
+    """
+    Merge per-collection newest() streams into one newest-first list.
+    Each stream comes with a visibility predicate on the record key; hidden
+    items are skipped before they count toward `limit`.
+    """
+    def visible_items(stream: Iterator[Tuple[str, FeedItem]], visible: Callable[[str], bool]) -> Iterator[FeedItem]:
+        return (item for key, item in stream if visible(key))
+
+    filtered = [visible_items(stream, visible) for stream, visible in streams]
+    out: List[FeedItem] = []
+    for item in heapq.merge(*filtered, key=lambda it: it["flaggedAt"], reverse=True):
+        if limit is not None and len(out) >= limit:
+            break
+        out.append(item)
+    return out
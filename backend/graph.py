@@ -0,0 +1,313 @@
+"""
+Relationship graph for /api/graph.
+
+People and intel name each other in free text: known_associates and
+recent_contacts hold names or aliases of other people, intel linked_persons
+names people and linked_reports names other intel (by id or title).
+RelationGraph resolves those references to records and keeps the result
+current as either collection is written. It is attached to both stores
+through the two Index views returned by people_index() and intel_index().
+
+Nothing is materialized per edge. The graph keeps
+- labels: folded full_name/aliases (people) or id/title (intel) -> nodes
+- references: node -> the folded labels it names, per field
+- mentions: folded label -> the nodes naming it
+so a write only touches the labels and references of that one record, and a
+name written before its person exists links up once the person is created.
+Neighbours of a node are its references resolved through `labels` plus
+whoever mentions one of its own labels; edges are undirected for traversal.
+
+Queries take the set of node keys the caller may see per collection; hidden
+nodes are neither returned nor walked through, so a path never leaks them.
+"""
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from store import Index, Record, normalize_id
+
+Node = Tuple[str, str]  # (collection, key)
+
+PEOPLE, INTEL = "people", "intel"
+# field -> collection its names resolve to
+REFERENCE_FIELDS: Dict[str, Dict[str, str]] = {
+    PEOPLE: {"known_associates": PEOPLE, "recent_contacts": PEOPLE},
+    INTEL: {"linked_persons": PEOPLE, "linked_reports": INTEL},
+}
+_PLACEHOLDERS = {"", "n/a", "na", "none", "unknown", "-"}
+
+
+def fold_name(value: Any) -> str:
+    return " ".join(str(value).split()).lower()
+
+def node_id(node: Node) -> str:
+    return f"{node[0]}:{node[1]}"
+
+def _labels_of(collection: str, rec: Record) -> Set[str]:
+    if collection == PEOPLE:
+        names = [rec.get("full_name", ""), *(rec.get("known_aliases") or [])]
+    else:
+        names = [rec.get("title", ""), normalize_id(rec.get("id", ""))]
+    return {n for n in map(fold_name, names) if n not in _PLACEHOLDERS}
+
+def _refs_of(collection: str, rec: Record) -> Set[Tuple[str, str]]:
+    out: Set[Tuple[str, str]] = set()
+    for field in REFERENCE_FIELDS[collection]:
+        values = rec.get(field) or []
+        if isinstance(values, str):
+            values = [values]
+        for v in values:
+            name = fold_name(v)
+            if name.startswith("#"):
+                name = normalize_id(name[1:])
+            if name not in _PLACEHOLDERS:
+                out.add((field, name))
+    return out
+
+
+class _Side(Index):
+    """One collection's hook into the shared graph."""
+
+    def __init__(self, graph: "RelationGraph", collection: str) -> None:
+        self.graph = graph
+        self.collection = collection
+
+    def rebuild(self, records: List[Record]) -> None:
+        self.graph._rebuild(self.collection, [(self.store.key_of(r), r) for r in records])
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        self.graph._update(
+            self.collection,
+            self.store.key_of(old) if old is not None else None,
+            (self.store.key_of(new), new) if new is not None else None,
+        )
+
+
+class RelationGraph:
+    """Name-resolved adjacency over people and intel."""
+
+    def __init__(self) -> None:
+        self._sides = {PEOPLE: _Side(self, PEOPLE), INTEL: _Side(self, INTEL)}
+        self._labels: Dict[str, Dict[str, Set[Node]]] = {PEOPLE: {}, INTEL: {}}
+        self._mentions: Dict[str, Dict[str, Dict[Node, Set[str]]]] = {PEOPLE: {}, INTEL: {}}
+        self._node_labels: Dict[Node, Set[str]] = {}
+        self._node_refs: Dict[Node, Set[Tuple[str, str]]] = {}
+        self._titles: Dict[Node, str] = {}
+        self._lock = threading.Lock()
+
+    def people_index(self) -> Index:
+        return self._sides[PEOPLE]
+
+    def intel_index(self) -> Index:
+        return self._sides[INTEL]
+
+    # ---- maintenance ----
+    def _rebuild(self, collection: str, items: List[Tuple[str, Record]]) -> None:
+        with self._lock:
+            for node in [n for n in self._node_labels if n[0] == collection]:
+                self._remove(node)
+            for key, rec in items:
+                self._add((collection, key), rec)
+
+    def _update(self, collection: str, old_key: Optional[str], new: Optional[Tuple[str, Record]]) -> None:
+        with self._lock:
+            if old_key is not None:
+                self._remove((collection, old_key))
+            if new is not None:
+                self._remove((collection, new[0]))
+                self._add((collection, new[0]), new[1])
+
+    def _add(self, node: Node, rec: Record) -> None:
+        collection = node[0]
+        labels = _labels_of(collection, rec)
+        refs = _refs_of(collection, rec)
+        self._node_labels[node] = labels
+        self._node_refs[node] = refs
+        self._titles[node] = str(rec.get("full_name" if collection == PEOPLE else "title", ""))
+        for label in labels:
+            self._labels[collection].setdefault(label, set()).add(node)
+        targets = REFERENCE_FIELDS[collection]
+        for field, name in refs:
+            self._mentions[targets[field]].setdefault(name, {}).setdefault(node, set()).add(field)
+
+    def _remove(self, node: Node) -> None:
+        labels = self._node_labels.pop(node, None)
+        if labels is None:
+            return
+        collection = node[0]
+        for label in labels:
+            nodes = self._labels[collection].get(label)
+            if nodes is not None:
+                nodes.discard(node)
+                if not nodes:
+                    del self._labels[collection][label]
+        targets = REFERENCE_FIELDS[collection]
+        for field, name in self._node_refs.pop(node, ()):
+            by_node = self._mentions[targets[field]].get(name)
+            if by_node is not None and by_node.pop(node, None) is not None and not by_node:
+                del self._mentions[targets[field]][name]
+        self._titles.pop(node, None)
+
+    # ---- lookups ----
+    def _sync(self) -> None:
+        for side in self._sides.values():
+            side._sync()
+
+    def resolve(self, ref: str) -> List[Node]:
+        """
+        Nodes for "people:<id>", "intel:<id>", or a person's name/alias.
+        """
+        self._sync()
+        collection, sep, rest = ref.partition(":")
+        with self._lock:
+            if sep and collection in self._labels:
+                node = (collection, normalize_id(rest))
+                return [node] if node in self._node_labels else []
+            return sorted(self._labels[PEOPLE].get(fold_name(ref), ()))
+
+    def title(self, node: Node) -> str:
+        return self._titles.get(node, "")
+
+    def _edges(self, node: Node) -> Iterator[Tuple[Node, Node, str]]:
+        """(source, target, field) for every edge touching `node`; source names target."""
+        targets = REFERENCE_FIELDS[node[0]]
+        for field, name in self._node_refs.get(node, ()):
+            for other in self._labels[targets[field]].get(name, ()):
+                yield node, other, field
+        mentions = self._mentions[node[0]]
+        for label in self._node_labels.get(node, ()):
+            for other, fields in mentions.get(label, {}).items():
+                for field in fields:
+                    yield other, node, field
+
+    def _neighbours(self, node: Node, visible: Dict[str, Set[str]]) -> Set[Node]:
+        out = set()
+        for src, dst, _ in self._edges(node):
+            other = dst if src == node else src
+            if other != node and other[1] in visible.get(other[0], ()):
+                out.add(other)
+        return out
+
+    # ---- traversal ----
+    def expand(
+        self,
+        start: Node,
+        visible: Dict[str, Set[str]],
+        depth: int = 1,
+        limit: int = 200,
+    ) -> Dict[str, Any]:
+        """
+        Breadth-first walk up to `depth` hops from `start`, stopping once
+        `limit` nodes are collected. Returns nodes (with their hop count) and
+        the edges among them; "truncated" says the limit cut the walk short.
+        """
+        self._sync()
+        with self._lock:
+            hops: Dict[Node, int] = {start: 0}
+            frontier = [start]
+            truncated = False
+            for d in range(1, depth + 1):
+                following: List[Node] = []
+                for node in frontier:
+                    for other in sorted(self._neighbours(node, visible)):
+                        if other in hops:
+                            continue
+                        if len(hops) >= limit:
+                            truncated = True
+                            break
+                        hops[other] = d
+                        following.append(other)
+                    if truncated:
+                        break
+                if truncated or not following:
+                    break
+                frontier = following
+            edges = self._edges_among(hops)
+            nodes = [self._node_out(n, h) for n, h in sorted(hops.items(), key=lambda x: (x[1], x[0]))]
+        return {"nodes": nodes, "edges": edges, "truncated": truncated}
+
+    def path(
+        self,
+        start: Node,
+        goal: Node,
+        visible: Dict[str, Set[str]],
+        max_hops: int = 6,
+        budget: int = 10000,
+    ) -> Optional[List[Node]]:
+        """
+        Shortest path from `start` to `goal` through visible nodes, found by
+        bidirectional BFS; None if there is none within `max_hops` or the
+        search visits more than `budget` nodes.
+        """
+        self._sync()
+        if start == goal:
+            return [start]
+        with self._lock:
+            parents: Tuple[Dict[Node, Optional[Node]], Dict[Node, Optional[Node]]] = ({start: None}, {goal: None})
+            frontiers = ([start], [goal])
+            hops = 0
+            while frontiers[0] and frontiers[1] and hops < max_hops:
+                side = 0 if len(frontiers[0]) <= len(frontiers[1]) else 1
+                seen, other_seen = parents[side], parents[1 - side]
+                following: List[Node] = []
+                meet: Optional[Node] = None
+                for node in frontiers[side]:
+                    for nxt in sorted(self._neighbours(node, visible)):
+                        if nxt in seen:
+                            continue
+                        seen[nxt] = node
+                        if nxt in other_seen:
+                            meet = nxt
+                            break
+                        following.append(nxt)
+                    if meet is not None:
+                        break
+                hops += 1
+                if meet is not None:
+                    return self._join(meet, parents[0], parents[1])
+                if len(parents[0]) + len(parents[1]) > budget:
+                    return None
+                frontiers = (following, frontiers[1]) if side == 0 else (frontiers[0], following)
+        return None
+
+    @staticmethod
+    def _join(meet: Node, forward: Dict[Node, Optional[Node]], backward: Dict[Node, Optional[Node]]) -> List[Node]:
+        head: List[Node] = []
+        node: Optional[Node] = meet
+        while node is not None:
+            head.append(node)
+            node = forward[node]
+        head.reverse()
+        node = backward[meet]
+        while node is not None:
+            head.append(node)
+            node = backward[node]
+        return head
+
+    def describe(self, nodes: Iterable[Node]) -> Dict[str, Any]:
+        """Nodes (in order) plus the edges between consecutive ones."""
+        nodes = list(nodes)
+        with self._lock:
+            return {
+                "nodes": [self._node_out(n, i) for i, n in enumerate(nodes)],
+                "edges": self._edges_among({n: 0 for n in nodes}, chain=nodes),
+            }
+
+    def _node_out(self, node: Node, hops: int) -> Dict[str, Any]:
+        return {"node": node_id(node), "collection": node[0], "id": node[1], "label": self.title(node), "hops": hops}
+
+    def _edges_among(self, nodes: Dict[Node, int], chain: Optional[List[Node]] = None) -> List[Dict[str, Any]]:
+        pairs = set(zip(chain, chain[1:])) | set(zip(chain[1:], chain)) if chain is not None else None
+        found: Dict[Tuple[Node, Node], Set[str]] = {}
+        for node in nodes:
+            for src, dst, field in self._edges(node):
+                if src == dst or src not in nodes or dst not in nodes:
+                    continue
+                if pairs is not None and (src, dst) not in pairs:
+                    continue
+                found.setdefault((src, dst), set()).add(field)
+        return [
+            {"source": node_id(src), "target": node_id(dst), "via": sorted(fields)}
+            for (src, dst), fields in sorted(found.items())
+        ]
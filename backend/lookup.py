@@ -0,0 +1,158 @@
+"""
+Identifier lookups for /api/lookup: vehicle plates, tracked devices and
+radio frequencies on people records.
+
+IdentifierIndex holds one kind of identifier, normalized (plates and device
+ids uppercased with spaces/dashes dropped; frequencies as numbers, so "66",
+"66.0" and "66 MHz" agree), with
+- exact: normalized value -> person keys
+- prefix: a sorted list of values, bisected ("7DJ" finds 7DJ144ME)
+- partial: a sorted list of every suffix of every value, so a fragment from
+  anywhere in the identifier is a prefix search too ("144ME"). "?" stands for
+  one unknown character ("7DJ1?4ME"): the longest known run is looked up and
+  the candidates are checked against the full pattern.
+Placeholders such as "N/A" are not indexed.
+"""
+from __future__ import annotations
+
+import re
+from bisect import bisect_left, insort
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from store import Index, Record
+
+LOOKUP_MODES = ("exact", "prefix", "partial")
+_PLACEHOLDERS = {"", "N/A", "NA", "NONE", "UNKNOWN", "-"}
+
+
+def normalize_code(value: Any) -> str:
+    """Plates and device ids: uppercase, no whitespace, dashes or colons."""
+    return re.sub(r"[\s\-:]", "", str(value)).upper()
+
+def normalize_frequency(value: Any) -> str:
+    text = re.sub(r"(?i)\s*mhz$", "", str(value).strip())
+    try:
+        return format(float(text), "g")
+    except ValueError:
+        return normalize_code(text)
+
+def vehicle_plates(rec: Record) -> List[Any]:
+    out = []
+    for v in rec.get("known_vehicles") or []:
+        out.append(v.get("plate", "") if isinstance(v, dict) else v)
+    return out
+
+def field_values(field: str) -> Callable[[Record], List[Any]]:
+    def values(rec: Record) -> List[Any]:
+        raw = rec.get(field) or []
+        return raw if isinstance(raw, list) else [raw]
+    return values
+
+
+class IdentifierIndex(Index):
+    """Exact/prefix/partial lookups over one identifier extracted from people."""
+
+    def __init__(self, extract: Callable[[Record], Iterable[Any]], normalize: Callable[[Any], str] = normalize_code) -> None:
+        self._extract = extract
+        self._normalize = normalize
+        self._clear()
+
+    def _clear(self) -> None:
+        self._exact: Dict[str, Set[str]] = {}
+        self._values: List[str] = []  # sorted distinct values
+        self._suffixes: List[Tuple[str, str]] = []  # sorted (suffix, value)
+        self._by_key: Dict[str, Set[str]] = {}
+
+    def _codes(self, rec: Record) -> Set[str]:
+        codes = {self._normalize(v) for v in self._extract(rec) if v is not None and not isinstance(v, (dict, list))}
+        return {c for c in codes if c not in _PLACEHOLDERS}
+
+    # ---- maintenance ----
+    def rebuild(self, records: List[Record]) -> None:
+        self._clear()
+        for rec in records:
+            key = self.store.key_of(rec)
+            codes = self._codes(rec)
+            if codes:
+                self._by_key[key] = codes
+                for code in codes:
+                    self._exact.setdefault(code, set()).add(key)
+        self._values = sorted(self._exact)
+        self._suffixes = sorted((v[i:], v) for v in self._values for i in range(len(v)))
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        if old is not None:
+            key = self.store.key_of(old)
+            for code in self._by_key.pop(key, ()):
+                keys = self._exact.get(code)
+                if keys is None:
+                    continue
+                keys.discard(key)
+                if not keys:
+                    del self._exact[code]
+                    self._drop_value(code)
+        if new is not None:
+            key = self.store.key_of(new)
+            codes = self._codes(new)
+            if codes:
+                self._by_key[key] = codes
+            for code in codes:
+                keys = self._exact.get(code)
+                if keys is None:
+                    self._exact[code] = keys = set()
+                    insort(self._values, code)
+                    for i in range(len(code)):
+                        insort(self._suffixes, (code[i:], code))
+                keys.add(key)
+
+    def _drop_value(self, code: str) -> None:
+        i = bisect_left(self._values, code)
+        if i < len(self._values) and self._values[i] == code:
+            del self._values[i]
+        for j in range(len(code)):
+            entry = (code[j:], code)
+            i = bisect_left(self._suffixes, entry)
+            if i < len(self._suffixes) and self._suffixes[i] == entry:
+                del self._suffixes[i]
+
+    # ---- queries ----
+    def _prefixed(self, prefix: str) -> Set[str]:
+        values = self._values
+        out = set()
+        i = bisect_left(values, prefix)
+        while i < len(values) and values[i].startswith(prefix):
+            out.add(values[i])
+            i += 1
+        return out
+
+    def _containing(self, fragment: str) -> Set[str]:
+        suffixes = self._suffixes
+        out = set()
+        i = bisect_left(suffixes, (fragment, ""))
+        while i < len(suffixes) and suffixes[i][0].startswith(fragment):
+            out.add(suffixes[i][1])
+            i += 1
+        return out
+
+    def _wildcard(self, pattern: str, mode: str) -> Set[str]:
+        body = re.escape(pattern).replace(r"\?", ".")
+        rx = re.compile({"exact": f"^{body}$", "prefix": f"^{body}"}.get(mode, body))
+        runs = [r for r in pattern.split("?") if r]
+        candidates = self._containing(max(runs, key=len)) if runs else self._values
+        return {v for v in candidates if rx.search(v)}
+
+    def matches(self, query: str, mode: str = "exact") -> Dict[str, Set[str]]:
+        """{normalized value: person keys} for values matching `query`."""
+        self._sync()
+        q = self._normalize(query)
+        if not q:
+            return {}
+        if "?" in q:
+            values = self._wildcard(q, mode)
+        elif mode == "exact":
+            values = {q} if q in self._exact else set()
+        elif mode == "prefix":
+            values = self._prefixed(q)
+        else:
+            values = self._containing(q)
+        return {v: set(self._exact.get(v, ())) for v in sorted(values)}
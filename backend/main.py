@@ -1,27 +1,68 @@
 from __future__ import annotations
 
-import json
+import os
+from contextlib import asynccontextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, TypedDict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple, TypedDict
 
-from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi import FastAPI, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import TypeAdapter, ValidationError
 
 # ACL / Session helpers (make sure backend/auth.py exists with these)
 from auth import (
+    CLEARANCE_ORDER,
+    clearance_at_least,
+    clearance_level,
     make_session,
+    record_required_clearance,
     read_user_from_request,
     require_clearance,
-    can_view_record,
+    token_from_request,
+    SESSION_CACHE,
     SESSION_COOKIE,
 )
+from batch import Transaction
+from bulk import import_records, read_ndjson, spool_body, stream_ndjson
+from changes import ChangeEmitter, ChangeFeed, stream_events
+from delta import ChangeLog, decode_since, encode_since
+from facets import FacetIndex
+from feed import FeedIndex, merge_newest
+from graph import RelationGraph
+from lookup import LOOKUP_MODES, IdentifierIndex, field_values, normalize_frequency, vehicle_plates
+from media import (
+    INTEL_MEDIA_FIELDS,
+    MEDIA_CACHE_CONTROL,
+    PEOPLE_MEDIA_FIELDS,
+    MediaRefIndex,
+    MediaStore,
+    iter_file,
+    parse_range,
+)
+from metrics import (
+    CONDITIONAL_GETS,
+    CONTENT_TYPE,
+    PROFILER,
+    REGISTRY,
+    MetricsMiddleware,
+    record_scan,
+)
+from paging import SortedIndex, id_sort_value, paginate, parse_fields, stream_page, text_sort_value
+from roster import ActivityTracker, UsernameIndex
+from search import IntelTextIndex, PersonSearchIndex
+from store import MULTI_WORKER, normalize_id, open_collection
+from visibility import ClearanceIndex
 
 # ========= Paths / storage =========
-ROOT = Path(__file__).parent
+# ARCHIVE_DATA_DIR points the app at another set of JSON files (e.g. bench/)
+ROOT = Path(os.getenv("ARCHIVE_DATA_DIR") or Path(__file__).parent)
 AGENTS_PATH = ROOT / "agents.json"
 PEOPLE_PATH = ROOT / "people.json"
 INTEL_PATH = ROOT / "inteldata.json"
+MEDIA_DIR = Path(os.getenv("ARCHIVE_MEDIA_DIR") or ROOT / "media")
 
 # ========= Types =========
 class AgentRecord(TypedDict, total=False):
@@ -42,6 +83,12 @@ class AgentRecord(TypedDict, total=False):
     onDuty: bool
     lastDutyChange: str
 
+class VehicleRecord(TypedDict, total=False):
+    make: str
+    model: str
+    color: str
+    plate: str
+
 class PersonRecord(TypedDict, total=False):
     id: int
     full_name: str
@@ -55,7 +102,7 @@ class PersonRecord(TypedDict, total=False):
     organization_ties: List[str]
     recent_contacts: List[str]
     suspected_informant: str
-    known_vehicles: List[str]
+    known_vehicles: List[VehicleRecord]
     tracked_devices: List[str]
     radio_frequencies: List[str]
     recent_movements: List[str]
@@ -96,102 +143,323 @@ def _now_iso() -> str:
 def _today_str() -> str:
     return datetime.utcnow().date().isoformat()
 
-def _ensure_file(path: Path, default: Any) -> None:
-    if not path.exists():
-        path.write_text(json.dumps(default, indent=2), encoding="utf-8")
-
-def _load_json(path: Path, default: Any) -> Any:
-    _ensure_file(path, default)
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
-
-def _save_json(path: Path, data: Any) -> None:
-    tmp = path.with_suffix(".tmp.json")
-    tmp.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf-8")
-    tmp.replace(path)
-
-def _normalize_id_str(x: Any) -> str:
-    """Normalize '001', '1', 1 -> '1' for comparisons."""
-    s = str(x).strip()
-    if s.isdigit():
-        return str(int(s))
-    return s
-
-def load_agents() -> List[AgentRecord]:
-    data = _load_json(AGENTS_PATH, [])
-    return list(data.values()) if isinstance(data, dict) else data
-
-def save_agents(data: List[AgentRecord]) -> None:
-    _save_json(AGENTS_PATH, data)
+# All endpoints go through these stores (backend picked by ARCHIVE_STORAGE).
+# Reads are served from memory; put()/delete() persist one record at a time.
+AGENTS = open_collection("agents", AGENTS_PATH)
+PEOPLE = open_collection("people", PEOPLE_PATH)
+INTEL = open_collection("intel", INTEL_PATH, default={"results": []})
+
+# Logouts and clearance changes reach every worker through sessions.revoked
+if MULTI_WORKER:
+    SESSION_CACHE.share(ROOT / "sessions")
+
+# Login looks agents up by folded username; lastActive bumps are batched
+AGENT_LOGINS = AGENTS.attach(UsernameIndex())
+ACTIVITY = ActivityTracker(AGENTS)
+
+# Required clearance computed once per write; callers filter by set lookup
+PEOPLE_ACL = PEOPLE.attach(ClearanceIndex())
+INTEL_ACL = INTEL.attach(ClearanceIndex())
+
+# Maintained on every people write; /api/search never scans the collection
+PEOPLE_SEARCH = PEOPLE.attach(PersonSearchIndex())
+INTEL_TEXT = INTEL.attach(IntelTextIndex())
+
+# Modification order + tombstones for /api/changes
+PEOPLE_LOG = PEOPLE.attach(ChangeLog())
+INTEL_LOG = INTEL.attach(ChangeLog())
+
+# Associates/contacts/linked records resolved to ids, for /api/graph
+GRAPH = RelationGraph()
+PEOPLE.attach(GRAPH.people_index())
+INTEL.attach(GRAPH.intel_index())
+
+# Value -> keys postings for ?field=value filters and /api/facets
+PEOPLE_FACETS = PEOPLE.attach(FacetIndex(["gang_affiliation", "nationality", "internal_flags", "access_level"]))
+INTEL_FACETS = INTEL.attach(FacetIndex(["status", "classification", "operation_code"]))
+
+# Plate / device / frequency lookups for /api/lookup
+PEOPLE_IDENTIFIERS = {
+    "plate": PEOPLE.attach(IdentifierIndex(vehicle_plates)),
+    "device": PEOPLE.attach(IdentifierIndex(field_values("tracked_devices"))),
+    "freq": PEOPLE.attach(IdentifierIndex(field_values("radio_frequencies"), normalize_frequency)),
+}
+
+# Uploaded files by SHA-256; downloads follow the ACL of the records citing them
+MEDIA = MediaStore(MEDIA_DIR)
+PEOPLE_MEDIA = PEOPLE.attach(MediaRefIndex(PEOPLE_MEDIA_FIELDS))
+INTEL_MEDIA = INTEL.attach(MediaRefIndex(INTEL_MEDIA_FIELDS))
+
+# Server-side sort orders for ?sort= on /api/all and /api/intel
+PEOPLE_SORTS = {
+    "id": PEOPLE.attach(SortedIndex()),
+    "last_updated": PEOPLE.attach(SortedIndex(text_sort_value("last_updated"))),
+    "full_name": PEOPLE.attach(SortedIndex(text_sort_value("full_name"))),
+}
+INTEL_SORTS = {
+    "id": INTEL.attach(SortedIndex()),
+    "last_updated": INTEL.attach(SortedIndex(text_sort_value("last_updated"))),
+    "title": INTEL.attach(SortedIndex(text_sort_value("title"))),
+}
+
+def _visible_within(acl: ClearanceIndex, user: Dict[str, Any], matched: Optional[Set[str]]) -> Optional[Set[str]]:
+    """Visible keys narrowed to `matched`; None means every record."""
+    if acl.sees_everything(user):
+        return matched
+    keys = acl.visible_keys(user)
+    return keys if matched is None else keys & matched
+
+def _list_response(
+    records: List[Dict[str, Any]],
+    sorts: Dict[str, SortedIndex],
+    acl: ClearanceIndex,
+    user: Dict[str, Any],
+    limit: Optional[int],
+    cursor: Optional[str],
+    sort: Optional[str],
+    fields: Optional[str],
+    matched: Optional[Set[str]] = None,
+    endpoint: str = "list",
+) -> StreamingResponse:
+    """
+    Stream the caller-visible records (narrowed to `matched` keys, if given).
+    Without limit/cursor/sort this is the whole collection in archive order
+    ({"results": [...]}, as always); otherwise one page plus "next_cursor"
+    (null on the last page).
+    """
+    projection = parse_fields(fields)
+    keys = _visible_within(acl, user, matched)
+    tally = [0, 0]  # scanned, returned
 
-def load_people() -> List[PersonRecord]:
-    data = _load_json(PEOPLE_PATH, [])
-    return list(data.values()) if isinstance(data, dict) else data
+    def visible(rec: Dict[str, Any]) -> bool:
+        tally[0] += 1
+        return keys is None or acl.store.key_of(rec) in keys
 
-def save_people(data: List[PersonRecord]) -> None:
-    _save_json(PEOPLE_PATH, data)
+    def counted(items: Iterable[Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+        try:
+            for rec in items:
+                tally[1] += 1
+                yield rec
+        finally:
+            record_scan(endpoint, tally[0], tally[1])
+
+    if limit is None and cursor is None and sort is None:
+        body = stream_page(counted(r for r in records if visible(r)), projection)
+    else:
+        items, next_cursor = paginate(sorts, sort or "id", limit, cursor, visible)
+        body = stream_page(counted(items), projection, next_cursor)
+    return StreamingResponse(body, media_type="application/json")
+
+# ========= Mutations =========
+# Shared by the single-record endpoints, bulk import and /api/batch. `db` is
+# the store (or a batch's staged view of it); call inside its writing() block
+# so ids from next_id() and existence checks hold until the write lands.
+_PERSON_MODEL = TypeAdapter(PersonRecord)
+_INTEL_MODEL = TypeAdapter(IntelRecord)
+_AGENT_MODEL = TypeAdapter(AgentRecord)
+
+def _check(model: TypeAdapter, fields: Dict[str, Any], record: Optional[Dict[str, Any]] = None) -> None:
+    """
+    422 unless `fields` fit the record type and, for classified collections,
+    `record` (the whole record being written) can be classified. Runs before
+    anything is written, so a bad record never reaches the store or a batch.
+    """
+    try:
+        model.validate_python(fields)
+    except ValidationError as e:
+        err = e.errors()[0]
+        where = ".".join(str(p) for p in err["loc"])
+        raise HTTPException(422, detail=f"{where}: {err['msg']}" if where else err["msg"])
+    if record is not None:
+        try:
+            record_required_clearance(record)
+        except Exception:
+            raise HTTPException(422, detail="classification/internal_flags must be strings")
 
-def load_intel() -> List[IntelRecord]:
-    data = _load_json(INTEL_PATH, [])
-    return list(data.values()) if isinstance(data, dict) else data
+def _int_id(db: Any, payload: Dict[str, Any]) -> None:
+    if payload.get("id") is None:
+        payload["id"] = db.next_id()
+        return
+    try:
+        payload["id"] = int(payload["id"])
+    except Exception:
+        raise HTTPException(400, detail="ID must be an integer")
 
-def save_intel(data: List[IntelRecord]) -> None:
-    _save_json(INTEL_PATH, data)
+def _prepare_person(payload: Dict[str, Any], db: Any = PEOPLE) -> Dict[str, Any]:
+    _int_id(db, payload)
+    payload.setdefault("created_by", "system")
+    payload["last_updated"] = _now_iso()
+    _check(_PERSON_MODEL, payload, payload)
+    return payload
 
-def _next_person_id(people: List[PersonRecord]) -> int:
-    max_id = 0
-    for p in people:
-        try:
-            v = int(p.get("id", 0))
-            if v > max_id:
-                max_id = v
-        except Exception:
-            continue
-    return max_id + 1
+def _prepare_intel(payload: Dict[str, Any], db: Any = INTEL) -> Dict[str, Any]:
+    _int_id(db, payload)
+    _check(_INTEL_MODEL, payload, payload)
+    return payload
 
-def _next_intel_id(intels: List[IntelRecord]) -> int:
-    max_id = 0
-    for r in intels:
-        try:
-            v = int(r.get("id", 0))
-            if v > max_id:
-                max_id = v
-        except Exception:
-            continue
-    return max_id + 1
+def _prepare_agent(payload: Dict[str, Any], db: Any = AGENTS) -> AgentRecord:
+    required = ["name", "password", "rank", "clearance"]
+    missing = [k for k in required if not str(payload.get(k, "")).strip()]
+    if missing:
+        raise HTTPException(400, detail=f"Missing fields: {', '.join(missing)}")
+    # Assign ID if absent
+    if not str(payload.get("id", "")).strip():
+        # next "numeric" id but kept as string; you can pad in frontend if desired
+        new_id = str(db.next_id())
+    else:
+        new_id = str(payload["id"]).strip()
+    agent: AgentRecord = {
+        "id": new_id,
+        "name": str(payload.get("name", "")).strip(),
+        "username": str(payload.get("username", "")).strip(),
+        "password": str(payload.get("password", "")),  # DEMO ONLY
+        "rank": str(payload.get("rank", "")),
+        "clearance": str(payload.get("clearance", "")),
+        "createdBy": str(payload.get("createdBy", "system")),
+        "createdAt": _today_str(),
+        "lastActive": _now_iso(),
+        # pass-through for optional RP fields if sent
+        **{k: v for k, v in payload.items() if k not in {
+            "id","name","username","password","rank","clearance","createdBy","createdAt","lastActive"
+        }},
+    }
+    _check(_AGENT_MODEL, agent)
+    return agent
+
+def _create_person(db: Any, payload: Dict[str, Any]) -> Dict[str, Any]:
+    explicit_id = payload.get("id") is not None
+    _prepare_person(payload, db)
+    if explicit_id and normalize_id(payload["id"]) in db:
+        raise HTTPException(409, detail="A person with this ID already exists")
+    db.put(payload)
+    return payload
+
+def _create_intel(db: Any, payload: Dict[str, Any]) -> Dict[str, Any]:
+    explicit_id = payload.get("id") is not None
+    _prepare_intel(payload, db)
+    if explicit_id and normalize_id(payload["id"]) in db:
+        raise HTTPException(409, detail="An intel entry with this ID already exists")
+    db.put(payload)
+    return payload
+
+def _create_agent(db: Any, payload: Dict[str, Any]) -> AgentRecord:
+    agent = _prepare_agent(payload, db)
+    if db.key_of(agent) in db:
+        raise HTTPException(409, detail="An agent with this ID already exists")
+    db.put(agent)
+    return agent
+
+def _edit(db: Any, model: TypeAdapter, record_id: str, payload: Dict[str, Any], missing: str, taken: str) -> Tuple[Dict[str, Any], str]:
+    """Merge `payload` into a person/intel record; the id may change if it stays unique."""
+    norm = normalize_id(record_id)
+    current = db.get(norm)
+    if not current:
+        raise HTTPException(404, detail=missing)
+    updated = dict(current)
+    updated.update(payload)
+    _check(model, payload, updated)
+    try:
+        updated["id"] = int(updated.get("id", current["id"]))
+    except Exception:
+        updated["id"] = current["id"]
+    if normalize_id(updated["id"]) != norm and normalize_id(updated["id"]) in db:
+        raise HTTPException(409, detail=taken)
+    return updated, norm
+
+def _update_person(db: Any, person_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    updated, norm = _edit(db, _PERSON_MODEL, person_id, payload, "Person not found", "A person with this ID already exists")
+    updated["last_updated"] = _now_iso()
+    db.put(updated, key=norm)
+    return updated
+
+def _update_intel(db: Any, intel_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    updated, norm = _edit(db, _INTEL_MODEL, intel_id, payload, "Intel not found", "Intel with this ID already exists")
+    db.put(updated, key=norm)
+    return updated
+
+def _update_agent(db: Any, agent_id: str, payload: Dict[str, Any]) -> Tuple[AgentRecord, AgentRecord]:
+    """Returns (updated, previous)."""
+    a = db.get(normalize_id(agent_id))
+    if not a:
+        raise HTTPException(404, detail="Agent not found")
+    updated = dict(a)
+    # controlled updates
+    for key in ["name", "username", "password", "rank", "clearance"]:
+        if key in payload:
+            updated[key] = str(payload[key]) if payload[key] is not None else ""
+    # pass-through additional meta fields if provided
+    for k, v in payload.items():
+        if k not in ["id", "createdAt", "createdBy"]:
+            updated[k] = v
+    _check(_AGENT_MODEL, {k: updated[k] for k in payload if k in updated})
+    updated["lastActive"] = _now_iso()
+    db.put(updated)
+    return updated, a
+
+def _delete(db: Any, record_id: str, missing: str) -> Dict[str, Any]:
+    deleted = db.delete(normalize_id(record_id))
+    if not deleted:
+        raise HTTPException(404, detail=missing)
+    return deleted
+
+def _set_priority(db: Any, record_id: str, want: bool, missing: str) -> Dict[str, Any]:
+    found = db.get(normalize_id(record_id))
+    if not found:
+        raise HTTPException(404, detail=missing)
+    rec = dict(found)
+    if rec.get("internal_flags") is None:
+        rec["internal_flags"] = []
+    _set_high_priority(rec, want)
+    db.put(rec)
+    return rec
+
+def _agent_changed(old: AgentRecord, new: Optional[AgentRecord]) -> None:
+    """Session side effects of an agent write, once it is committed."""
+    if new is None:
+        ACTIVITY.forget(AGENTS.key_of(old))
+        SESSION_CACHE.revoke_subject(old.get("id"))
+    elif new.get("clearance") != old.get("clearance"):
+        # sessions carry the old clearance: make the agent log in again
+        SESSION_CACHE.revoke_subject(old.get("id"))
+
+# ========= Conditional GET =========
+def _etag(user: Dict[str, Any], *versions: Any) -> str:
+    """Weak ETag for a response that only depends on these versions and the caller's tier."""
+    return 'W/"' + "-".join(str(v) for v in versions) + f'-t{clearance_level(user)}"'
+
+def _cache_headers(etag: str) -> Dict[str, str]:
+    # per-user data: browsers may keep it, but must revalidate every time
+    return {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+def _not_modified(request: Request, etag: str, headers: Optional[Dict[str, str]] = None) -> Optional[Response]:
+    """A 304 if If-None-Match already names `etag` (weak comparison), else None."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return None
+    tags = {t.strip().removeprefix("W/") for t in header.split(",")}
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        CONDITIONAL_GETS.inc("hit")
+        return Response(status_code=304, headers=headers or _cache_headers(etag))
+    CONDITIONAL_GETS.inc("miss")
+    return None
 
 def _public_agent(agent: AgentRecord) -> AgentRecord:
-    a = dict(agent)
+    a = dict(ACTIVITY.overlay(agent))
     a.pop("password", None)
     return a  # type: ignore[return-value]
 
-def _matches_query(person: PersonRecord, q: str) -> bool:
-    """Loose match across useful fields."""
-    if not q:
-        return True
-    ql = q.lower()
-    fields = [
-        str(person.get("id", "")),
-        person.get("full_name", ""),
-        *(person.get("known_aliases", []) or []),
-        person.get("dob", ""),
-        person.get("gender", ""),
-        person.get("nationality", ""),
-        person.get("current_address", ""),
-        person.get("gang_affiliation", ""),
-        *(person.get("known_associates", []) or []),
-        *(person.get("organization_ties", []) or []),
-        *(person.get("recent_contacts", []) or []),
-        person.get("suspected_informant", ""),
-        person.get("blackmail_material", ""),
-        person.get("created_by", ""),
-        person.get("access_level", ""),
-        *(person.get("internal_flags", []) or []),
-    ]
-    return any(ql in str(x).lower() for x in fields)
-
 # ========= App =========
-app = FastAPI(title="The Archive API", version="1.0.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    ACTIVITY.start()
+    yield
+    ACTIVITY.stop()
+    PROFILER.stop()
+    # fold journals back into the snapshot files on clean shutdown
+    for coll in (AGENTS, PEOPLE, INTEL):
+        coll.compact()
+
+app = FastAPI(title="The Archive API", version="1.0.0", lifespan=lifespan)
 
 # ✅ Explicit dev origins, *no wildcard* when credentials are enabled
 app.add_middleware(
@@ -206,12 +474,65 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # ---- Health ----
 @app.get("/healthz")
 def health() -> Dict[str, str]:
     return {"status": "ok", "time": _now_iso()}
 
+# ---- Metrics ----
+METRICS_TOKEN = os.getenv("ARCHIVE_METRICS_TOKEN", "")
+
+REGISTRY.callback("archive_session_cache_hits_total", "Verified-session cache hits", (),
+                  lambda: {(): SESSION_CACHE.stats()["hits"]}, kind="counter")
+REGISTRY.callback("archive_session_cache_misses_total", "Verified-session cache misses", (),
+                  lambda: {(): SESSION_CACHE.stats()["misses"]}, kind="counter")
+REGISTRY.callback("archive_session_cache_size", "Sessions in the verified-session cache", (),
+                  lambda: {(): SESSION_CACHE.stats()["size"]})
+REGISTRY.callback("archive_records", "Records in each collection", ("collection",),
+                  lambda: {(name,): len(store.records()) for name, store in
+                           (("agents", AGENTS), ("people", PEOPLE), ("intel", INTEL))})
+REGISTRY.callback("archive_event_subscribers", "Open /api/events streams", (),
+                  lambda: {(): CHANGES.subscribers()})
+REGISTRY.callback("archive_profiler_running", "1 while the sampling profiler is on", (),
+                  lambda: {(): int(PROFILER.running)})
+
+@app.get("/metrics")
+def metrics(request: Request) -> Response:
+    """Prometheus text format. Set ARCHIVE_METRICS_TOKEN to require it as a Bearer token."""
+    if METRICS_TOKEN and request.headers.get("Authorization", "") != f"Bearer {METRICS_TOKEN}":
+        raise HTTPException(401, detail="Not authenticated")
+    return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+@app.post("/metrics/profiler")
+def set_profiler(body: Dict[str, Any], request: Request) -> Dict[str, Any]:
+    """
+    Redline only. Body: { "enabled": bool, "interval_ms": 10, "reset": bool }
+    Returns the profiler status.
+    """
+    require_clearance(request, "Redline")
+    if body.get("reset"):
+        PROFILER.reset()
+    if "enabled" in body:
+        if body["enabled"]:
+            try:
+                interval = float(body.get("interval_ms", PROFILER.interval * 1000)) / 1000.0
+            except (TypeError, ValueError):
+                raise HTTPException(400, detail="interval_ms must be a number")
+            if not 0.001 <= interval <= 1.0:
+                raise HTTPException(400, detail="interval_ms must be between 1 and 1000")
+            PROFILER.start(interval)
+        else:
+            PROFILER.stop()
+    return PROFILER.status()
+
+@app.get("/metrics/profile")
+def get_profile(request: Request) -> Response:
+    """Collapsed stacks sampled so far ("frame;frame;frame count"), for flamegraph tools."""
+    require_clearance(request, "Redline")
+    return Response(PROFILER.collapsed(), media_type="text/plain; charset=utf-8")
+
 # =======================
 #        AUTH
 # =======================
@@ -225,11 +546,9 @@ def login(payload: Dict[str, Any], response: Response) -> Dict[str, Any]:
     if not username or not password:
         raise HTTPException(400, detail="Username and password are required")
 
-    agents = load_agents()
-    for a in agents:
-        if (a.get("username") or "").strip().lower() == username.lower() and (a.get("password") or "") == password:
-            a["lastActive"] = _now_iso()
-            save_agents(agents)
+    for a in AGENT_LOGINS.lookup(username):
+        if (a.get("password") or "") == password:
+            ACTIVITY.touch(AGENTS.key_of(a), _now_iso())
             user_pub = _public_agent(a)
             token = make_session(user_pub)
             response.set_cookie(
@@ -243,7 +562,7 @@ def login(payload: Dict[str, Any], response: Response) -> Dict[str, Any]:
             )
             return {"user": user_pub, "token": token}
 
-    # No match after checking all agents
+    # No agent with that username/password
     raise HTTPException(401, detail="Invalid credentials")
 
 
@@ -255,7 +574,10 @@ def me(request: Request) -> Dict[str, Any]:
     return {"user": user}
 
 @app.post("/api/logout")
-def logout(response: Response) -> Dict[str, Any]:
+def logout(request: Request, response: Response) -> Dict[str, Any]:
+    token = token_from_request(request)
+    if token:
+        SESSION_CACHE.revoke(token)
     response.delete_cookie(SESSION_COOKIE, path="/")
     return {"message": "ok"}
 
@@ -263,132 +585,81 @@ def logout(response: Response) -> Dict[str, Any]:
 #        AGENTS
 # =======================
 @app.get("/api/agents")
-def list_agents(request: Request) -> List[AgentRecord]:
+def list_agents(request: Request, response: Response) -> List[AgentRecord]:
     """TopSecret+ can view full roster (PUBLIC view: no passwords)."""
-    require_clearance(request, "TopSecret")
-    return [_public_agent(a) for a in load_agents()]
+    user = require_clearance(request, "TopSecret")
+    etag = _etag(user, AGENTS.version(), ACTIVITY.version)
+    cached = _not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers.update(_cache_headers(etag))
+    return [_public_agent(a) for a in AGENTS.records()]
 
 @app.get("/api/agents/{agent_id}")
-def get_agent(agent_id: str, request: Request) -> AgentRecord:
-    require_clearance(request, "TopSecret")
-    agents = load_agents()
-    target = _normalize_id_str(agent_id)
-    for a in agents:
-        if _normalize_id_str(a.get("id", "")) == target:
-            return _public_agent(a)
-    raise HTTPException(404, detail="Agent not found")
+def get_agent(agent_id: str, request: Request, response: Response) -> AgentRecord:
+    user = require_clearance(request, "TopSecret")
+    etag = _etag(user, AGENTS.version(), ACTIVITY.version)
+    cached = _not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers.update(_cache_headers(etag))
+    a = AGENTS.get(normalize_id(agent_id))
+    if not a:
+        raise HTTPException(404, detail="Agent not found")
+    return _public_agent(a)
 
 @app.post("/api/agents")
 def create_agent(payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     """Create agent. Only Redline may create."""
     require_clearance(request, "Redline")
-    required = ["name", "password", "rank", "clearance"]
-    missing = [k for k in required if not str(payload.get(k, "")).strip()]
-    if missing:
-        raise HTTPException(400, detail=f"Missing fields: {', '.join(missing)}")
-
-    agents = load_agents()
-
-    # Assign ID if absent
-    if not str(payload.get("id", "")).strip():
-        # compute next "numeric" id but keep as string; you can pad in frontend if desired
-        numeric_ids = []
-        for a in agents:
-            s = str(a.get("id", "")).strip()
-            if s.isdigit():
-                numeric_ids.append(int(s))
-            else:
-                try:
-                    numeric_ids.append(int(s.lstrip("0") or "0"))
-                except Exception:
-                    pass
-        next_id_num = (max(numeric_ids) + 1) if numeric_ids else 1
-        new_id = str(next_id_num)
-    else:
-        new_id = str(payload["id"]).strip()
-
-    agent: AgentRecord = {
-        "id": new_id,
-        "name": str(payload.get("name", "")).strip(),
-        "username": str(payload.get("username", "")).strip(),
-        "password": str(payload.get("password", "")),  # DEMO ONLY
-        "rank": str(payload.get("rank", "")),
-        "clearance": str(payload.get("clearance", "")),
-        "createdBy": str(payload.get("createdBy", "system")),
-        "createdAt": _today_str(),
-        "lastActive": _now_iso(),
-        # pass-through for optional RP fields if sent
-        **{k: v for k, v in payload.items() if k not in {
-            "id","name","username","password","rank","clearance","createdBy","createdAt","lastActive"
-        }},
-    }
-
-    agents.append(agent)
-    save_agents(agents)
+    # id allocation and insert in one write block (ids stay unique across workers)
+    with AGENTS.writing():
+        agent = _create_agent(AGENTS, payload)
     return {"message": "created", "agent": _public_agent(agent)}
 
 @app.put("/api/agents/{agent_id}")
 def update_agent(agent_id: str, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     require_clearance(request, "Redline")
-    agents = load_agents()
-    target = _normalize_id_str(agent_id)
-
-    for idx, a in enumerate(agents):
-        if _normalize_id_str(a.get("id", "")) == target:
-            updated = dict(a)
-            # controlled updates
-            for key in ["name", "username", "password", "rank", "clearance"]:
-                if key in payload:
-                    updated[key] = str(payload[key]) if payload[key] is not None else ""
-            # pass-through additional meta fields if provided
-            for k, v in payload.items():
-                if k not in ["id", "createdAt", "createdBy"]:
-                    updated[k] = v
-            updated["lastActive"] = _now_iso()
-            agents[idx] = updated
-            save_agents(agents)
-            return {"message": "updated", "agent": _public_agent(updated)}
-
-    raise HTTPException(404, detail="Agent not found")
+    with AGENTS.writing():
+        updated, previous = _update_agent(AGENTS, agent_id, payload)
+    _agent_changed(previous, updated)
+    return {"message": "updated", "agent": _public_agent(updated)}
 
 @app.delete("/api/agents/{agent_id}")
 def delete_agent(agent_id: str, request: Request) -> Dict[str, Any]:
     require_clearance(request, "Redline")
-    agents = load_agents()
-    target = _normalize_id_str(agent_id)
-    new_agents: List[AgentRecord] = []
-    deleted: Optional[AgentRecord] = None
-    for a in agents:
-        if _normalize_id_str(a.get("id", "")) == target:
-            deleted = a
-        else:
-            new_agents.append(a)
-    if not deleted:
-        raise HTTPException(404, detail="Agent not found")
-    save_agents(new_agents)
+    deleted = _delete(AGENTS, agent_id, "Agent not found")
+    _agent_changed(deleted, None)
     return {"message": "deleted", "agent": _public_agent(deleted)}
 
 # =======================
 #        PEOPLE
 # =======================
 @app.get("/api/all")
-def list_people(request: Request) -> dict:
+def list_people(
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> Response:
     """
     Minimal+ can list people; results are filtered by per-record visibility.
     - Default people are Minimal unless flagged "Person of Interest" (Restricted)
-      or given a 'classification' field (then mapping is handled in auth.can_view_record()).
+      or given a 'classification' field (then mapping is handled in auth.record_required_clearance()).
+    - Optional paging: ?limit=&cursor=&sort=(-)last_updated|full_name|id&fields=a,b
+    - Optional filters: ?gang_affiliation=&nationality=&internal_flags=&access_level=
+      (repeat a field to accept any of several values)
     """
-    require_clearance(request, "Minimal")
-    user = read_user_from_request(request)
-    try:
-        people = load_people()
-        if not isinstance(people, list):
-            people = []
-        # filter by can_view_record
-        visible = [p for p in people if can_view_record(user, p)] if user else []
-        return {"results": visible}
-    except Exception:
-        return {"results": []}
+    user = require_clearance(request, "Minimal")
+    etag = _etag(user, PEOPLE.version())
+    cached = _not_modified(request, etag)
+    if cached:
+        return cached
+    matched = PEOPLE_FACETS.matching(PEOPLE_FACETS.parse(request.query_params))
+    listing = _list_response(PEOPLE.records(), PEOPLE_SORTS, PEOPLE_ACL, user, limit, cursor, sort, fields, matched, "people_list")
+    listing.headers.update(_cache_headers(etag))
+    return listing
 
 @app.post("/api/search")
 def search_people(payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
@@ -397,155 +668,120 @@ def search_people(payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     Body: { "query": "string" }
     Returns: { "results": [...] }
     """
-    require_clearance(request, "Minimal")
-    user = read_user_from_request(request)
+    user = require_clearance(request, "Minimal")
     query = str(payload.get("query", "")).strip()
     if not query:
         return {"results": []}
-    people = load_people()
-    matched = [p for p in people if _matches_query(p, query)]
-    visible = [p for p in matched if can_view_record(user, p)] if user else []
+    stats: Dict[str, int] = {}
+    visible = PEOPLE_SEARCH.search(query, within=PEOPLE_ACL.visible_keys(user), stats=stats)
+    record_scan("people_search", stats["scanned"], len(visible))
     return {"results": visible}
 
 @app.post("/api/create")
 def create_person(payload: PersonRecord, request: Request) -> Dict[str, Any]:
     # Only Redline may create/edit/delete people
     require_clearance(request, "Redline")
-    people = load_people()
-    if "id" not in payload or payload["id"] is None:
-        payload["id"] = _next_person_id(people)
-    else:
-        try:
-            new_id = int(payload["id"])
-        except Exception:
-            raise HTTPException(400, detail="ID must be an integer")
-        payload["id"] = new_id
-        for p in people:
-            if int(p.get("id", -1)) == new_id:
-                raise HTTPException(409, detail="A person with this ID already exists")
-
-    payload.setdefault("created_by", "system")
-    payload["last_updated"] = _now_iso()
-
-    people.append(payload)
-    save_people(people)
+    with PEOPLE.writing():
+        _create_person(PEOPLE, payload)
     return {"message": "created", "person": payload}
 
 @app.put("/api/update/{person_id}")
 def update_person(person_id: str, payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
     require_clearance(request, "Redline")
-    people = load_people()
-    norm = _normalize_id_str(person_id)
-    for idx, p in enumerate(people):
-        if _normalize_id_str(p.get("id", "")) == norm:
-            updated = dict(p)
-            updated.update(payload)
-            try:
-                updated["id"] = int(updated.get("id", p["id"]))
-            except Exception:
-                updated["id"] = p["id"]
-            updated["last_updated"] = _now_iso()
-            people[idx] = updated
-            save_people(people)
-            return {"message": "updated", "person": updated}
-    raise HTTPException(404, detail="Person not found")
+    with PEOPLE.writing():
+        updated = _update_person(PEOPLE, person_id, payload)
+    return {"message": "updated", "person": updated}
 
 @app.delete("/api/delete/{person_id}")
 def delete_person(person_id: str, request: Request) -> Dict[str, Any]:
     require_clearance(request, "Redline")
-    people = load_people()
-    norm = _normalize_id_str(person_id)
-    new_people: List[PersonRecord] = []
-    deleted: Optional[PersonRecord] = None
-    for p in people:
-        if _normalize_id_str(p.get("id", "")) == norm:
-            deleted = p
-        else:
-            new_people.append(p)
-    if not deleted:
-        raise HTTPException(404, detail="Person not found")
-    save_people(new_people)
+    deleted = _delete(PEOPLE, person_id, "Person not found")
     return {"message": "deleted", "person": deleted}
 
 # =======================
 #         INTEL
 # =======================
-# (Note: redeclare load_intel for legacy {"results": [...]} format if needed)
-def load_intel() -> List[IntelRecord]:
-    data = _load_json(INTEL_PATH, {"results": []})
-    if isinstance(data, dict) and isinstance(data.get("results"), list):
-        return data["results"]
-    return data if isinstance(data, list) else []
-
 @app.get("/api/intel")
-def list_intel(request: Request) -> Dict[str, List[IntelRecord]]:
+def list_intel(
+    request: Request,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    sort: Optional[str] = None,
+    fields: Optional[str] = None,
+) -> Response:
+    """
+    Optional paging: ?limit=&cursor=&sort=(-)last_updated|title|id&fields=a,b
+    Optional filters: ?status=&classification=&operation_code= (repeatable)
+    """
     user = require_clearance(request, "Operational")
-    items = load_intel()
-    visible = [r for r in items if can_view_record(user, r)]
-    return {"results": visible}
+    etag = _etag(user, INTEL.version())
+    cached = _not_modified(request, etag)
+    if cached:
+        return cached
+    matched = INTEL_FACETS.matching(INTEL_FACETS.parse(request.query_params))
+    listing = _list_response(INTEL.records(), INTEL_SORTS, INTEL_ACL, user, limit, cursor, sort, fields, matched, "intel_list")
+    listing.headers.update(_cache_headers(etag))
+    return listing
 
 @app.post("/api/intel")
 def create_intel(payload: IntelRecord, request: Request) -> Dict[str, IntelRecord]:
     require_clearance(request, "Operational")
-    items = load_intel()
-    if "id" not in payload or payload["id"] is None:
-        payload["id"] = _next_intel_id(items)
-    else:
-        try:
-            payload["id"] = int(payload["id"])
-        except Exception:
-            raise HTTPException(400, detail="ID must be an integer")
-    items.append(payload)
-    save_intel(items)
+    with INTEL.writing():
+        _create_intel(INTEL, payload)
     return {"entry": payload}
 
+@app.post("/api/intel/search")
+def search_intel(payload: Dict[str, Any], request: Request) -> Dict[str, Any]:
+    """
+    Ranked full-text search over title, summary, operation code, source,
+    collection method and linked organizations/operations.
+    Body: { "query": "string", "limit": 20 }
+    Returns: { "results": [{"score", "record", "field", "snippet", "highlights": [[start, end], ...]}] }
+    """
+    user = require_clearance(request, "Operational")
+    query = str(payload.get("query", "")).strip()
+    try:
+        limit = int(payload.get("limit", 20))
+    except (TypeError, ValueError):
+        raise HTTPException(400, detail="limit must be an integer")
+    if not 1 <= limit <= 100:
+        raise HTTPException(400, detail="limit must be between 1 and 100")
+    if not query:
+        return {"results": []}
+    within = None if INTEL_ACL.sees_everything(user) else INTEL_ACL.visible_keys(user)
+    stats: Dict[str, int] = {}
+    hits = INTEL_TEXT.search(query, within=within, k=limit, stats=stats)
+    record_scan("intel_search", stats["scanned"], len(hits))
+    return {"results": hits}
+
 @app.put("/api/intel/{intel_id}")
 def update_intel(intel_id: str, payload: IntelRecord, request: Request) -> Dict[str, IntelRecord]:
     require_clearance(request, "Operational")
-    items = load_intel()
-    norm = _normalize_id_str(intel_id)
-    for idx, r in enumerate(items):
-        if _normalize_id_str(r.get("id", "")) == norm:
-            updated = dict(r)
-            updated.update(payload)
-            try:
-                updated["id"] = int(updated.get("id", r["id"]))
-            except Exception:
-                updated["id"] = r["id"]
-            items[idx] = updated
-            save_intel(items)
-            return {"entry": updated}
-    raise HTTPException(404, detail="Intel not found")
+    with INTEL.writing():
+        updated = _update_intel(INTEL, intel_id, payload)
+    return {"entry": updated}
 
 @app.delete("/api/intel/{intel_id}")
 def delete_intel(intel_id: str, request: Request) -> Dict[str, Any]:
     require_clearance(request, "Operational")
-    items = load_intel()
-    norm = _normalize_id_str(intel_id)
-    new_items: List[IntelRecord] = []
-    deleted: Optional[IntelRecord] = None
-    for r in items:
-        if _normalize_id_str(r.get("id", "")) == norm:
-            deleted = r
-        else:
-            new_items.append(r)
-    if not deleted:
-        raise HTTPException(404, detail="Intel not found")
-    save_intel(new_items)
+    deleted = _delete(INTEL, intel_id, "Intel not found")
     return {"message": "deleted", "intel": deleted}
 
 @app.get("/api/intel/{intel_id}")
-def read_intel(intel_id: str, request: Request) -> Dict[str, Any]:
+def read_intel(intel_id: str, request: Request, response: Response) -> Dict[str, Any]:
     user = require_clearance(request, "Operational")
-    items = load_intel()
-    target = _normalize_id_str(intel_id)
-    for rec in items:
-        if _normalize_id_str(rec.get("id", "")) == target:
-            # enforce per-record classification on read
-            if not can_view_record(user, rec):
-                raise HTTPException(403, detail="Insufficient clearance for this file")
-            return {"entry": rec}
-    raise HTTPException(404, detail="Intel not found")
+    etag = _etag(user, INTEL.version())
+    cached = _not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers.update(_cache_headers(etag))
+    rec = INTEL.get(normalize_id(intel_id))
+    if not rec:
+        raise HTTPException(404, detail="Intel not found")
+    # enforce per-record classification on read
+    if not INTEL_ACL.can_view(user, rec):
+        raise HTTPException(403, detail="Insufficient clearance for this file")
+    return {"entry": rec}
 
 # --- High Priority helpers (add-only) ---
 def _has_high_priority(rec: Dict[str, Any]) -> bool:
@@ -571,76 +807,466 @@ def _set_high_priority(rec: Dict[str, Any], value: bool) -> None:
     if "last_updated" in rec:
         rec["last_updated"] = _now_iso()
 
+def _person_feed_item(p: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not _has_high_priority(p):
+        return None
+    return {
+        "id": p.get("id"),
+        "type": "person",
+        "title": p.get("full_name") or p.get("name") or f"Person {p.get('id')}",
+        "flaggedAt": p.get("high_priority_at") or p.get("last_updated") or _now_iso(),
+    }
+
+def _intel_feed_item(i: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    if not _has_high_priority(i):
+        return None
+    return {
+        "id": i.get("id"),
+        "type": "intel",
+        "title": i.get("title") or f"Intel {i.get('id')}",
+        "flaggedAt": i.get("high_priority_at") or i.get("last_updated") or _now_iso(),
+    }
+
+# Flagged records, kept ordered by flaggedAt on every write (incl. internal_flags edits)
+PEOPLE_FEED = PEOPLE.attach(FeedIndex(_person_feed_item))
+INTEL_FEED = INTEL.attach(FeedIndex(_intel_feed_item))
+
+# Every write to the three collections, for /api/events
+CHANGES = ChangeFeed()
+PEOPLE.attach(ChangeEmitter(CHANGES, "people", flagged=_has_high_priority))
+INTEL.attach(ChangeEmitter(CHANGES, "intel", flagged=_has_high_priority))
+AGENTS.attach(ChangeEmitter(
+    CHANGES, "agents", tier=lambda a: CLEARANCE_ORDER["TopSecret"], public=_public_agent,
+))
+
 @app.get("/api/high-priority")
-def get_high_priority(request: Request) -> List[Dict[str, Any]]:
+def get_high_priority(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = None,
+    since: Optional[str] = None,
+) -> List[Dict[str, Any]]:
     """
     Minimal+ can view the combined high-priority feed,
     but each entry is filtered by per-record visibility.
+    Newest first; ?limit=N caps it, ?since=<ISO timestamp> keeps only newer flags.
     """
     user = require_clearance(request, "Minimal")
-    people = load_people()
-    intel = load_intel()
-
-    out: List[Dict[str, Any]] = []
-
-    # people (filter by visibility)
-    for p in (people or []):
-        if isinstance(p, dict) and _has_high_priority(p) and can_view_record(user, p):
-            out.append({
-                "id": p.get("id"),
-                "type": "person",
-                "title": p.get("full_name") or p.get("name") or f"Person {p.get('id')}",
-                "flaggedAt": p.get("high_priority_at") or p.get("last_updated") or _now_iso(),
-            })
-
-    # intel (filter by visibility)
-    for i in (intel or []):
-        if isinstance(i, dict) and _has_high_priority(i) and can_view_record(user, i):
-            out.append({
-                "id": i.get("id"),
-                "type": "intel",
-                "title": i.get("title") or f"Intel {i.get('id')}",
-                "flaggedAt": i.get("high_priority_at") or i.get("last_updated") or _now_iso(),
-            })
-
-    # newest first
-    out.sort(key=lambda r: r.get("flaggedAt", ""), reverse=True)
-    return out
+    if limit is not None and limit < 1:
+        raise HTTPException(400, detail="limit must be positive")
+    etag = _etag(user, PEOPLE.version(), INTEL.version())
+    cached = _not_modified(request, etag)
+    if cached:
+        return cached
+    response.headers.update(_cache_headers(etag))
+    people_visible = PEOPLE_ACL.visible_keys(user)
+    intel_visible = INTEL_ACL.visible_keys(user)
+    return merge_newest([
+        (PEOPLE_FEED.newest(since), people_visible.__contains__),
+        (INTEL_FEED.newest(since), intel_visible.__contains__),
+    ], limit)
 
 @app.post("/api/people/{person_id}/priority")
 def set_person_priority(person_id: str, body: Dict[str, Any], request: Request) -> Dict[str, Any]:
     # Editing people requires Redline
     require_clearance(request, "Redline")
-    items = load_people()
-    target = _normalize_id_str(person_id)
     want = bool(body.get("high_priority", True))
-
-    for rec in items:
-        if _normalize_id_str(rec.get("id", "")) == target:
-            if rec.get("internal_flags") is None:
-                rec["internal_flags"] = []
-            _set_high_priority(rec, want)
-            save_people(items)
-            return {"person": rec}
-
-    raise HTTPException(404, detail="Person not found")
+    with PEOPLE.writing():
+        rec = _set_priority(PEOPLE, person_id, want, "Person not found")
+    return {"person": rec}
 
 @app.post("/api/intel/{intel_id}/priority")
 def set_intel_priority(intel_id: str, body: Dict[str, Any], request: Request) -> Dict[str, Any]:
     # Editing intel requires Operational+
     require_clearance(request, "Operational")
-    items = load_intel()
-    target = _normalize_id_str(intel_id)
     want = bool(body.get("high_priority", True))
+    with INTEL.writing():
+        rec = _set_priority(INTEL, intel_id, want, "Intel not found")
+    return {"intel": rec}
+
+# =======================
+#     BULK IMPORT/EXPORT
+# =======================
+def _import_agent(payload: Dict[str, Any]) -> AgentRecord:
+    """_prepare_agent(), except that replacing an agent keeps its history, as PUT does."""
+    agent = _prepare_agent(payload)
+    old = AGENTS.get(AGENTS.key_of(agent))
+    if old is not None:
+        for key in ("createdAt", "createdBy", "lastActive"):
+            if key in old:
+                agent[key] = old[key]
+            else:
+                agent.pop(key, None)
+    return agent
+
+def _bulk_collection(name: str) -> Dict[str, Any]:
+    """Store, ACL and clearance rules for each importable/exportable collection."""
+    specs: Dict[str, Dict[str, Any]] = {
+        "people": {"store": PEOPLE, "acl": PEOPLE_ACL, "read": "Minimal", "write": "Redline",
+                   "prepare": _prepare_person, "public": None, "replaced": None},
+        "intel": {"store": INTEL, "acl": INTEL_ACL, "read": "Operational", "write": "Operational",
+                  "prepare": _prepare_intel, "public": None, "replaced": None},
+        "agents": {"store": AGENTS, "acl": None, "read": "TopSecret", "write": "Redline",
+                   "prepare": _import_agent, "public": _public_agent, "replaced": _agent_changed},
+    }
+    if name not in specs:
+        raise HTTPException(404, detail="Unknown collection; use people, intel or agents")
+    return specs[name]
+
+@app.post("/api/import/{collection}")
+async def import_collection(collection: str, request: Request, mode: str = "create") -> Dict[str, Any]:
+    """
+    Body: NDJSON, one record per line. Ids are assigned when absent.
+    ?mode=create (default) rejects existing ids; ?mode=upsert replaces them
+    (a replaced agent keeps createdAt/createdBy/lastActive and, as with PUT,
+    a clearance change ends their sessions).
+    All accepted lines are committed in one write.
+    Returns: { "created": n, "updated": n, "errors": [{"line": n, "error": "..."}] }
+    """
+    spec = _bulk_collection(collection)
+    require_clearance(request, spec["write"])
+    body = await spool_body(request.stream())
+    with body:
+        return await run_in_threadpool(import_records, spec["store"], read_ndjson(body), spec["prepare"], mode, spec["replaced"])
+
+@app.get("/api/export/{collection}")
+def export_collection(collection: str, request: Request, format: str = "ndjson") -> StreamingResponse:
+    """Stream every record the caller may see, as NDJSON (default) or ?format=json."""
+    spec = _bulk_collection(collection)
+    user = require_clearance(request, spec["read"])
+    if format not in ("ndjson", "json"):
+        raise HTTPException(400, detail="format must be ndjson or json")
+    records: Any = spec["store"].records()
+    acl: Optional[ClearanceIndex] = spec["acl"]
+    if acl is not None and not acl.sees_everything(user):
+        keys = acl.visible_keys(user)
+        records = (r for r in records if acl.store.key_of(r) in keys)
+    if spec["public"] is not None:
+        records = (spec["public"](r) for r in records)
+    headers = {"Content-Disposition": f'attachment; filename="{collection}.{format}"'}
+    if format == "ndjson":
+        return StreamingResponse(stream_ndjson(records), media_type="application/x-ndjson", headers=headers)
+    return StreamingResponse(stream_page(records), media_type="application/json", headers=headers)
+
+# =======================
+#        BATCH
+# =======================
+BATCH_LIMIT = 1000
+_BATCH_OPS = ("create", "update", "delete", "priority")
+# collection -> (store, clearance needed to write it, ops allowed)
+_BATCH_COLLECTIONS: Dict[str, Tuple[Any, str, Tuple[str, ...]]] = {
+    "people": (PEOPLE, "Redline", _BATCH_OPS),
+    "intel": (INTEL, "Operational", _BATCH_OPS),
+    "agents": (AGENTS, "Redline", ("create", "update", "delete")),
+}
+
+def _batch_op(db: Any, collection: str, op: Dict[str, Any]) -> Dict[str, Any]:
+    kind = op["op"]
+    data = dict(op.get("data") or {})
+    if kind == "create":
+        create = {"people": _create_person, "intel": _create_intel, "agents": _create_agent}[collection]
+        return {"record": create(db, data)}
+    if op.get("id") is None:
+        raise HTTPException(400, detail="id is required")
+    rid = str(op["id"])
+    missing = {"people": "Person not found", "intel": "Intel not found", "agents": "Agent not found"}[collection]
+    if kind == "update":
+        update = {"people": _update_person, "intel": _update_intel}.get(collection)
+        if update is None:
+            updated, previous = _update_agent(db, rid, data)
+            return {"record": updated, "previous": previous}
+        return {"record": update(db, rid, data)}
+    if kind == "delete":
+        return {"deleted": _delete(db, rid, missing)}
+    return {"record": _set_priority(db, rid, bool(op.get("high_priority", True)), missing)}
+
+@app.post("/api/batch")
+def batch(body: Dict[str, Any], request: Request) -> Dict[str, Any]:
+    """
+    Body: { "operations": [ {"op": "create"|"update"|"delete"|"priority",
+                             "collection": "people"|"intel"|"agents",
+                             "id": ..., "data": {...}, "high_priority": bool}, ... ] }
+    Operations run in order with the same clearance rules as their single
+    endpoints. Either every operation is applied or none is; each collection
+    touched gets one write. Errors name the failing operation.
+    Returns: { "results": [ {"op", "collection", "record" | "deleted"}, ... ] }
+    """
+    ops = body.get("operations")
+    if not isinstance(ops, list) or not ops:
+        raise HTTPException(400, detail="operations must be a non-empty list")
+    if len(ops) > BATCH_LIMIT:
+        raise HTTPException(413, detail=f"At most {BATCH_LIMIT} operations per batch")
+
+    used: List[Any] = []
+    for i, op in enumerate(ops):
+        try:
+            if not isinstance(op, dict) or op.get("collection") not in _BATCH_COLLECTIONS:
+                raise HTTPException(400, detail="collection must be people, intel or agents")
+            db, clearance, allowed = _BATCH_COLLECTIONS[op["collection"]]
+            if op.get("op") not in allowed:
+                raise HTTPException(400, detail=f"op must be one of: {', '.join(allowed)}")
+            if op.get("data") is not None and not isinstance(op["data"], dict):
+                raise HTTPException(400, detail="data must be an object")
+            require_clearance(request, clearance)
+        except HTTPException as e:
+            raise HTTPException(e.status_code, detail=f"operations[{i}]: {e.detail}")
+        if db not in used:
+            used.append(db)
+
+    # fixed lock order across batches: agents, people, intel
+    order = [s for s in (AGENTS, PEOPLE, INTEL) if s in used]
+    results: List[Dict[str, Any]] = []
+    with Transaction(order) as tx:
+        for i, op in enumerate(ops):
+            try:
+                out = _batch_op(tx.view(_BATCH_COLLECTIONS[op["collection"]][0]), op["collection"], op)
+            except HTTPException as e:
+                raise HTTPException(e.status_code, detail=f"operations[{i}]: {e.detail}")
+            results.append({"op": op["op"], "collection": op["collection"], **out})
+        tx.commit()
+
+    for r in results:
+        if r["collection"] != "agents":
+            continue
+        if "deleted" in r:
+            _agent_changed(r["deleted"], None)
+            r["deleted"] = _public_agent(r["deleted"])
+        else:
+            if "previous" in r:
+                _agent_changed(r.pop("previous"), r["record"])
+            r["record"] = _public_agent(r["record"])
+    return {"results": results}
+
+# =======================
+#        GRAPH
+# =======================
+GRAPH_MAX_DEPTH = 4
+GRAPH_MAX_NODES = 1000
+GRAPH_MAX_HOPS = 8
+
+def _graph_visible(user: Dict[str, Any]) -> Dict[str, Any]:
+    """Keys the caller may see per collection; intel needs Operational as on /api/intel."""
+    return {
+        "people": PEOPLE_ACL.visible_keys(user),
+        "intel": INTEL_ACL.visible_keys(user) if clearance_at_least(user, "Operational") else set(),
+    }
+
+def _graph_node(ref: str, visible: Dict[str, Any]) -> Tuple[str, str]:
+    nodes = [n for n in GRAPH.resolve(ref) if n[1] in visible.get(n[0], ())]
+    if not nodes:
+        raise HTTPException(404, detail=f"No record matches {ref!r}")
+    if len(nodes) > 1:
+        ids = ", ".join(f"{c}:{k}" for c, k in nodes)
+        raise HTTPException(409, detail=f"{ref!r} is ambiguous: {ids}")
+    return nodes[0]
+
+@app.get("/api/graph")
+def graph_neighbours(request: Request, start: str = Query(..., alias="from"), depth: int = 1, limit: int = 200) -> Dict[str, Any]:
+    """
+    Records within `depth` hops of `from` ("people:<id>", "intel:<id>", or a
+    person's name/alias). depth=1 gives direct neighbours.
+    Returns: { "nodes": [{"node", "collection", "id", "label", "hops"}],
+               "edges": [{"source", "target", "via": [field, ...]}], "truncated": bool }
+    """
+    user = require_clearance(request, "Minimal")
+    if not 0 <= depth <= GRAPH_MAX_DEPTH:
+        raise HTTPException(400, detail=f"depth must be between 0 and {GRAPH_MAX_DEPTH}")
+    if not 1 <= limit <= GRAPH_MAX_NODES:
+        raise HTTPException(400, detail=f"limit must be between 1 and {GRAPH_MAX_NODES}")
+    visible = _graph_visible(user)
+    return GRAPH.expand(_graph_node(start, visible), visible, depth=depth, limit=limit)
+
+@app.get("/api/graph/path")
+def graph_path(request: Request, start: str = Query(..., alias="from"), to: str = Query(...), max_hops: int = 6) -> Dict[str, Any]:
+    """
+    Shortest chain of visible records linking `from` to `to`.
+    Returns: { "found": bool, "hops": n, "nodes": [...], "edges": [...] }
+    """
+    user = require_clearance(request, "Minimal")
+    if not 1 <= max_hops <= GRAPH_MAX_HOPS:
+        raise HTTPException(400, detail=f"max_hops must be between 1 and {GRAPH_MAX_HOPS}")
+    visible = _graph_visible(user)
+    path = GRAPH.path(_graph_node(start, visible), _graph_node(to, visible), visible, max_hops=max_hops)
+    if path is None:
+        return {"found": False, "hops": None, "nodes": [], "edges": []}
+    return {"found": True, "hops": len(path) - 1, **GRAPH.describe(path)}
+
+# =======================
+#        FACETS
+# =======================
+@app.get("/api/facets/{collection}")
+def get_facets(collection: str, request: Request, fields: Optional[str] = None, top: int = 50) -> Response:
+    """
+    Value counts per faceted field over the records the caller can see,
+    narrowed by the same ?field=value filters as the list endpoint.
+    Returns: { "total": n, "facets": { field: [{"value", "count"}, ...] } }
+    """
+    if collection not in ("people", "intel"):
+        raise HTTPException(404, detail="Unknown collection; use people or intel")
+    store, acl, index, clearance = (
+        (PEOPLE, PEOPLE_ACL, PEOPLE_FACETS, "Minimal") if collection == "people"
+        else (INTEL, INTEL_ACL, INTEL_FACETS, "Operational")
+    )
+    user = require_clearance(request, clearance)
+    if top < 1:
+        raise HTTPException(400, detail="top must be positive")
+    etag = _etag(user, store.version())
+    cached = _not_modified(request, etag)
+    if cached:
+        return cached
+    within = _visible_within(acl, user, index.matching(index.parse(request.query_params)))
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else None
+    body = {"total": index.total(within), "facets": index.counts(within, names, top)}
+    return JSONResponse(body, headers=_cache_headers(etag))
+
+# =======================
+#        LOOKUP
+# =======================
+@app.get("/api/lookup")
+def lookup_identifiers(
+    request: Request,
+    plate: Optional[str] = None,
+    device: Optional[str] = None,
+    freq: Optional[str] = None,
+    mode: str = "exact",
+    limit: int = 100,
+) -> Dict[str, Any]:
+    """
+    People carrying a vehicle plate, tracked device or radio frequency.
+    ?mode=exact (default) | prefix | partial (fragment anywhere); "?" in the
+    query matches any one character. Several of plate/device/freq AND together.
+    Returns: { "results": [{"person": {...}, "matches": {"plate": ["7DJ144ME"], ...}}] }
+    """
+    user = require_clearance(request, "Minimal")
+    if mode not in LOOKUP_MODES:
+        raise HTTPException(400, detail=f"mode must be one of: {', '.join(LOOKUP_MODES)}")
+    if not 1 <= limit <= 500:
+        raise HTTPException(400, detail="limit must be between 1 and 500")
+    queries = {k: v for k, v in (("plate", plate), ("device", device), ("freq", freq)) if v}
+    if not queries:
+        raise HTTPException(400, detail="Give at least one of plate, device, freq")
+    keys = None if PEOPLE_ACL.sees_everything(user) else set(PEOPLE_ACL.visible_keys(user))
+    found: Dict[str, Dict[str, List[str]]] = {}
+    for kind, query in queries.items():
+        hits: Dict[str, List[str]] = {}
+        for value, owners in PEOPLE_IDENTIFIERS[kind].matches(query, mode).items():
+            for key in owners:
+                hits.setdefault(key, []).append(value)
+        keys = set(hits) if keys is None else keys & set(hits)
+        for key, values in hits.items():
+            found.setdefault(key, {})[kind] = values
+    results = []
+    for key in sorted(keys or (), key=id_sort_value)[:limit]:
+        person = PEOPLE.get(key)
+        if person is not None:
+            results.append({"person": person, "matches": found[key]})
+    return {"results": results}
+
+# =======================
+#     DELTA SYNC
+# =======================
+@app.get("/api/changes")
+def get_changes(request: Request, since: Optional[str] = None) -> Dict[str, Any]:
+    """
+    People (and intel, for Operational+) changed since the `next_since` of a
+    previous call. Without `since`, or when it can no longer be served, a
+    collection comes back with "reset": true and every visible record.
+    Cursors stay valid across workers in multi-worker mode.
+    Returns: { "people": {"reset", "changes"}, "intel": {...}, "next_since": "..." }
+    """
+    user = require_clearance(request, "Minimal")
+    level = clearance_level(user)
+    positions = decode_since(since) if since else {}
+    logs = {"people": PEOPLE_LOG}
+    if clearance_at_least(user, "Operational"):
+        logs["intel"] = INTEL_LOG
+    out: Dict[str, Any] = {}
+    next_positions = {}
+    for name, log in logs.items():
+        out[name], next_positions[name] = log.delta(positions.get(name), level)
+    out["next_since"] = encode_since(next_positions)
+    return out
+
+# =======================
+#        EVENTS
+# =======================
+@app.get("/api/events")
+def change_events(request: Request, last_event_id: Optional[str] = None) -> StreamingResponse:
+    """
+    Server-Sent Events: create/update/delete/priority changes to people, intel
+    and (TopSecret+) agents, filtered by the caller's clearance. Reconnects
+    resume from the Last-Event-ID header (or ?last_event_id=); a "reset" event
+    means the gap can't be replayed and the client should refetch. Event ids
+    are per worker: with several workers a reconnect that lands on another
+    one gets a "reset" (use /api/changes to catch up cheaply).
+    """
+    require_clearance(request, "Minimal")
+    resume = request.headers.get("last-event-id") or last_event_id
+    body = stream_events(
+        CHANGES,
+        resume,
+        current_user=lambda: read_user_from_request(request),
+        is_disconnected=request.is_disconnected,
+    )
+    return StreamingResponse(
+        body,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-    for rec in items:
-        if _normalize_id_str(rec.get("id", "")) == target:
-            if rec.get("internal_flags") is None:
-                rec["internal_flags"] = []
-            if "internal_flags" not in rec:
-                rec["internal_flags"] = []
-            _set_high_priority(rec, want)
-            save_intel(items)
-            return {"intel": rec}
-
-    raise HTTPException(404, detail="Intel not found")
+# =======================
+#        MEDIA
+# =======================
+@app.post("/api/media", status_code=201)
+async def upload_media(request: Request) -> Dict[str, Any]:
+    """
+    Body: the raw file (send its type as Content-Type). Stored once per
+    SHA-256; reference it from a record as the returned "url". The answer is
+    the same whether or not the bytes were already stored.
+    """
+    user = require_clearance(request, "Operational")
+    content_type = request.headers.get("content-type") or "application/octet-stream"
+    info = await MEDIA.save(request.stream(), content_type, user.get("username") or "")
+    info["url"] = f"/api/media/{info['sha256']}"
+    return info
+
+def _can_view_media(user: Dict[str, Any], info: Dict[str, Any]) -> bool:
+    sha = info["sha256"]
+    people = PEOPLE_MEDIA.owners(sha)
+    intel = INTEL_MEDIA.owners(sha)
+    if people & PEOPLE_ACL.visible_keys(user):
+        return True
+    if intel and clearance_at_least(user, "Operational") and intel & INTEL_ACL.visible_keys(user):
+        return True
+    if people or intel:
+        return False
+    # not attached to anything yet: only its uploaders (or Redline)
+    return user.get("username") in info["uploaders"] or clearance_at_least(user, "Redline")
+
+@app.api_route("/api/media/{sha}", methods=["GET", "HEAD"])
+def download_media(sha: str, request: Request) -> Response:
+    """The file, honouring a single `Range: bytes=` range (206) and If-Range."""
+    user = require_clearance(request, "Minimal")
+    info = MEDIA.info(sha.lower())
+    if info is None:
+        raise HTTPException(404, detail="Media not found")
+    if not _can_view_media(user, info):
+        raise HTTPException(403, detail="Insufficient clearance for this file")
+    etag = f'"{info["sha256"]}"'
+    headers = {"ETag": etag, "Cache-Control": MEDIA_CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    cached = _not_modified(request, etag, headers)
+    if cached:
+        return cached
+    size = info["size"]
+    if_range = request.headers.get("if-range")
+    span = parse_range(request.headers.get("range"), size) if if_range in (None, etag) else None
+    start, end = span or (0, size - 1)
+    headers["Content-Length"] = str(end - start + 1)
+    status = 200
+    if span is not None:
+        status = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    if request.method == "HEAD":
+        return Response(status_code=status, headers=headers, media_type=info["content_type"])
+    body = iter_file(MEDIA.path(info["sha256"]), start, end)
+    return StreamingResponse(body, status_code=status, headers=headers, media_type=info["content_type"])
@@ -0,0 +1,242 @@
+"""
+Content-addressed media for /api/media: photos, CCTV stills, audio clips and
+intel attachments.
+
+Uploads are streamed to a temp file under `<media>/tmp` while being hashed,
+then renamed to `<media>/<sha[:2]>/<sha>`; a second upload of the same bytes
+finds the file already there and is dropped, so every content is stored once.
+A small `<sha>.meta` sidecar keeps the content type and everyone who uploaded
+it. An upload answers only with the hash and size of what the caller sent,
+never with whether (or by whom) the bytes were stored before.
+
+Records never hold the bytes, only references: "/api/media/<sha256>" (or
+"media:<sha256>") anywhere in image_url, cctv_snapshots, intercepted_audio
+(people) or attachments (intel). MediaRefIndex maps each hash to the records
+that reference it, so a download is allowed exactly when the caller may see
+one of those records.
+
+Downloads are read from disk in chunks, with single-range Range requests,
+a strong ETag (the hash itself) and immutable caching: the bytes behind a URL
+can never change.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, AsyncIterator, BinaryIO, Dict, Iterator, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+
+from store import Index, Record
+
+MEDIA_MAX_BYTES = int(float(os.getenv("ARCHIVE_MEDIA_MAX_MB", "256")) * 1024 * 1024)
+_WRITE_BATCH = 1024 * 1024  # bytes gathered from the request per threadpool write
+PEOPLE_MEDIA_FIELDS = ("image_url", "cctv_snapshots", "intercepted_audio")
+INTEL_MEDIA_FIELDS = ("attachments",)
+MEDIA_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+_CHUNK = 64 * 1024
+_SHA = re.compile(r"[0-9a-f]{64}")
+_REF = re.compile(r"(?:/api/media/|media:)([0-9a-f]{64})")
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+def media_refs(value: Any) -> Set[str]:
+    """Every media hash referenced in a string, or in lists/dicts of them."""
+    if isinstance(value, str):
+        return set(_REF.findall(value))
+    if isinstance(value, dict):
+        value = list(value.values())
+    if isinstance(value, list):
+        out: Set[str] = set()
+        for v in value:
+            out |= media_refs(v)
+        return out
+    return set()
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Inclusive (start, end) for a single "bytes=" range, or None to send the
+    whole file (no header, or a multi-range/malformed one). 416 if it can't
+    be satisfied.
+    """
+    if not header:
+        return None
+    m = _RANGE.fullmatch(header.strip())
+    if not m or (not m.group(1) and not m.group(2)):
+        return None
+    first, last = m.groups()
+    if not first:
+        # suffix range: the last N bytes
+        start, end = max(0, size - int(last)), size - 1
+        if int(last) == 0:
+            start = size
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+        if last and int(last) < start:
+            return None
+    if start >= size:
+        raise HTTPException(416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{size}"})
+    return start, end
+
+def iter_file(path: Path, start: int, end: int) -> Iterator[bytes]:
+    """Bytes start..end (inclusive) of `path`, one chunk at a time."""
+    with path.open("rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(_CHUNK, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+def _write(f: BinaryIO, digest: Any, data: bytes) -> None:
+    digest.update(data)
+    f.write(data)
+
+def _discard(f: BinaryIO, tmp: Path) -> None:
+    f.close()
+    if tmp.exists():
+        tmp.unlink()
+
+
+class MediaStore:
+    """Blobs under `root`, named by their SHA-256."""
+
+    def __init__(self, root: Path, max_bytes: int = MEDIA_MAX_BYTES) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._meta_lock = threading.Lock()
+
+    def path(self, sha: str) -> Path:
+        return self.root / sha[:2] / sha
+
+    def info(self, sha: str) -> Optional[Dict[str, Any]]:
+        """Sidecar metadata for a stored blob, or None if there is no such blob."""
+        if not _SHA.fullmatch(sha):
+            return None
+        path = self.path(sha)
+        try:
+            size = path.stat().st_size
+        except FileNotFoundError:
+            return None
+        try:
+            meta = json.loads(path.with_suffix(".meta").read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            meta = {}
+        if "uploaders" not in meta:
+            meta["uploaders"] = [meta.pop("uploaded_by")] if "uploaded_by" in meta else []
+        meta.update({"sha256": sha, "size": size})
+        meta.setdefault("content_type", "application/octet-stream")
+        return meta
+
+    async def save(self, chunks: AsyncIterator[bytes], content_type: str, uploaded_by: str) -> Dict[str, Any]:
+        """
+        Stream `chunks` to disk, hashing as they arrive, and add `uploaded_by`
+        to the blob's uploaders. Returns only what the caller already knows:
+        {"sha256", "size", "content_type"} of their own upload.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        f, tmp = await run_in_threadpool(self._open_tmp)
+        try:
+            # the event loop only collects chunks; hashing and disk writes run in the threadpool
+            batch: List[bytes] = []
+            batched = 0
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    raise HTTPException(413, detail=f"Upload exceeds {self.max_bytes} bytes")
+                batch.append(chunk)
+                batched += len(chunk)
+                if batched >= _WRITE_BATCH:
+                    await run_in_threadpool(_write, f, digest, b"".join(batch))
+                    batch, batched = [], 0
+            if batch:
+                await run_in_threadpool(_write, f, digest, b"".join(batch))
+            await run_in_threadpool(f.close)
+            if size == 0:
+                raise HTTPException(400, detail="Empty upload")
+            sha = digest.hexdigest()
+            await run_in_threadpool(self._commit, tmp, sha, content_type, uploaded_by)
+        finally:
+            await run_in_threadpool(_discard, f, tmp)
+        return {"sha256": sha, "size": size, "content_type": content_type}
+
+    def _open_tmp(self) -> Tuple[BinaryIO, Path]:
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(parents=True, exist_ok=True)
+        fd, name = tempfile.mkstemp(dir=tmp_dir)
+        return os.fdopen(fd, "wb"), Path(name)
+
+    def _commit(self, tmp: Path, sha: str, content_type: str, uploaded_by: str) -> None:
+        path = self.path(sha)
+        with self._meta_lock:
+            meta = self.info(sha)
+            if meta is not None:
+                if uploaded_by not in meta["uploaders"]:
+                    self._write_meta(sha, {"content_type": meta["content_type"],
+                                           "uploaders": meta["uploaders"] + [uploaded_by]})
+                return
+            with tmp.open("rb") as f:
+                os.fsync(f.fileno())
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # metadata first: a blob is only visible once its sidecar exists
+            self._write_meta(sha, {"content_type": content_type, "uploaders": [uploaded_by]})
+            tmp.replace(path)
+
+    def _write_meta(self, sha: str, meta: Dict[str, Any]) -> None:
+        path = self.path(sha)
+        meta_tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        meta_tmp.write_text(json.dumps(meta), encoding="utf-8")
+        meta_tmp.replace(path.with_suffix(".meta"))
+
+
+class MediaRefIndex(Index):
+    """media hash -> keys of the records that reference it in `fields`."""
+
+    def __init__(self, fields: Tuple[str, ...]) -> None:
+        self.fields = fields
+        self._owners: Dict[str, Set[str]] = {}
+        self._by_key: Dict[str, Set[str]] = {}
+
+    def _refs(self, rec: Record) -> Set[str]:
+        out: Set[str] = set()
+        for field in self.fields:
+            out |= media_refs(rec.get(field))
+        return out
+
+    def rebuild(self, records: List[Record]) -> None:
+        self._owners = {}
+        self._by_key = {}
+        for rec in records:
+            self.update(None, rec)
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        if old is not None:
+            key = self.store.key_of(old)
+            for sha in self._by_key.pop(key, ()):
+                keys = self._owners.get(sha)
+                if keys is not None:
+                    keys.discard(key)
+                    if not keys:
+                        del self._owners[sha]
+        if new is not None:
+            refs = self._refs(new)
+            if refs:
+                key = self.store.key_of(new)
+                self._by_key[key] = refs
+                for sha in refs:
+                    self._owners.setdefault(sha, set()).add(key)
+
+    def owners(self, sha: str) -> Set[str]:
+        self._sync()
+        return set(self._owners.get(sha, ()))
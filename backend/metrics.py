@@ -0,0 +1,293 @@
+"""
+Process metrics in Prometheus text format, for GET /metrics.
+
+Counters and histograms are plain dicts of label values -> numbers behind one
+lock each, so recording costs a perf_counter() call and a dict update; no
+client library needed. CallbackMetric reads existing counters (e.g.
+SESSION_CACHE.stats()) at scrape time instead of duplicating them.
+
+MetricsMiddleware times every request and labels it with the route template
+("/api/intel/{intel_id}", not the concrete path) so label cardinality stays
+bounded; streamed bodies are timed until their last chunk is sent.
+
+SamplingProfiler is off by default and can be switched on and off at run
+time: while on, a background thread samples every thread's stack each
+`interval` seconds and counts them in collapsed-stack form ("a;b;c N"),
+ready for flamegraph tools.
+"""
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter as _Tally
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+LabelValues = Tuple[str, ...]
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(x: float) -> str:
+    if x == float("inf"):
+        return "+Inf"
+    return repr(int(x)) if float(x).is_integer() else repr(float(x))
+
+
+class Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+
+    def samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        head = f"# HELP {self.name} {self.help}\n# TYPE {self.name} {self.kind}\n"
+        return head + "".join(line + "\n" for line in self.samples())
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, help, labels)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in items]
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, List[float]] = {}  # per-bucket counts + [sum, count]
+
+    def observe(self, value: float, *labels: str) -> None:
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(labels)
+            if row is None:
+                self._values[labels] = row = [0.0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    @contextmanager
+    def time(self, *labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def count(self, *labels: str) -> float:
+        row = self._values.get(labels)
+        return row[-1] if row else 0.0
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        out = []
+        for key, row in items:
+            running = 0.0
+            for bound, n in zip(self.buckets, row):
+                running += n
+                le = 'le="%s"' % _number(bound)
+                out.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {_number(running)}")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {_number(row[-1])}")
+            out.append(f"{self.name}_sum{_labels(self.labels, key)} {_number(row[-2])}")
+            out.append(f"{self.name}_count{_labels(self.labels, key)} {_number(row[-1])}")
+        return out
+
+
+class CallbackMetric(Metric):
+    """Values read at scrape time: `read()` returns {label values: number}."""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], read: Callable[[], Dict[LabelValues, float]], kind: str = "gauge") -> None:
+        super().__init__(name, help, labels)
+        self.kind = kind
+        self._read = read
+
+    def samples(self) -> List[str]:
+        try:
+            items = sorted(self._read().items())
+        except Exception:
+            return []
+        return [f"{self.name}{_labels(self.labels, k)} {_number(v)}" for k, v in items]
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Any:
+        with self._lock:
+            self._metrics.setdefault(metric.name, metric)
+            return self._metrics[metric.name]
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def callback(self, name: str, help: str, labels: Sequence[str], read: Callable[[], Dict[LabelValues, float]], kind: str = "gauge") -> CallbackMetric:
+        return self.register(CallbackMetric(name, help, labels, read, kind))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "".join(m.render() for m in metrics)
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# ========= Shared instruments =========
+HTTP_LATENCY = REGISTRY.histogram("archive_http_request_duration_seconds", "Request latency by route", ("method", "route"))
+HTTP_RESPONSES = REGISTRY.counter("archive_http_responses_total", "Responses by route and status", ("method", "route", "status"))
+STORE_LOAD = REGISTRY.histogram("archive_store_load_seconds", "Time to read and parse a JSON snapshot", ("file",))
+STORE_SAVE = REGISTRY.histogram("archive_store_save_seconds", "Time to write a JSON snapshot", ("file",))
+STORE_SAVE_BYTES = REGISTRY.counter("archive_store_save_bytes_total", "Bytes written to JSON snapshots", ("file",))
+JOURNAL_APPEND = REGISTRY.histogram("archive_journal_append_seconds", "Journal append + fsync time per batch", ("file",))
+JOURNAL_BYTES = REGISTRY.counter("archive_journal_bytes_total", "Bytes appended to journals", ("file",))
+RECORDS_SCANNED = REGISTRY.counter("archive_records_scanned_total", "Records examined by list/search calls", ("endpoint",))
+RECORDS_RETURNED = REGISTRY.counter("archive_records_returned_total", "Records returned by list/search calls", ("endpoint",))
+CONDITIONAL_GETS = REGISTRY.counter("archive_conditional_get_total", "ETag checks answered with 304 (hit) or a body (miss)", ("result",))
+SESSION_DECODE = REGISTRY.histogram("archive_session_decode_seconds", "parse_session time; cached=false means a JWT verify", ("cached",))
+
+
+def record_scan(endpoint: str, scanned: int, returned: int) -> None:
+    RECORDS_SCANNED.inc(endpoint, amount=scanned)
+    RECORDS_RETURNED.inc(endpoint, amount=returned)
+
+
+# ========= Middleware =========
+class MetricsMiddleware:
+    """ASGI middleware: latency histogram + status counter per route template."""
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_wrapper(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = getattr(scope.get("route"), "path", None) or "unmatched"
+            method = scope.get("method", "")
+            HTTP_LATENCY.observe(time.perf_counter() - start, method, route)
+            HTTP_RESPONSES.inc(method, route, str(status[0]))
+
+
+# ========= Sampling profiler =========
+class SamplingProfiler:
+    """Counts collapsed stacks of all threads every `interval` seconds while running."""
+
+    def __init__(self, interval: float = 0.01, max_depth: int = 64) -> None:
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks: "_Tally[str]" = _Tally()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()  # each sampler thread gets its own
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def start(self, interval: Optional[float] = None) -> None:
+        with self._lock:
+            if interval:
+                self.interval = interval
+            if self._thread is not None:
+                return
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stop,),
+                                            name="archive-profiler", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stop.set()
+        if thread is not None:
+            thread.join()  # outside the lock: the sampler takes it to record
+
+    def reset(self) -> None:
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def _run(self, stop: threading.Event) -> None:
+        me = threading.get_ident()
+        while not stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for ident, frame in frames.items():
+                if ident == me:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                    frame = frame.f_back
+                stacks.append(";".join(reversed(names)))
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
+
+    def collapsed(self) -> str:
+        """"frame;frame;frame count" per line, most frequent first."""
+        with self._lock:
+            items = self._stacks.most_common()
+        return "".join(f"{stack} {n}\n" for stack, n in items)
+
+    def status(self) -> Dict[str, Any]:
+        return {"running": self.running, "interval_ms": round(self.interval * 1000, 3),
+                "samples": self.samples, "stacks": len(self._stacks)}
+
+
+PROFILER = SamplingProfiler()
@@ -0,0 +1,209 @@
+"""
+Cursor pagination, sorting and field projection for the list endpoints.
+
+SortedIndex keeps one collection ordered by a sort key (kept up to date by the
+store), so a page is a bisect to the cursor plus a walk of `limit` visible
+records, whatever the archive size. Cursors are opaque url-safe base64 of the
+last (value, id) pair returned plus the sort they belong to.
+
+stream_page() renders {"results": [...], "next_cursor": ...} incrementally so
+neither the page nor the whole collection is ever built as one JSON string.
+"""
+from __future__ import annotations
+
+import base64
+import json
+from bisect import bisect_left, bisect_right, insort
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from fastapi import HTTPException
+
+from store import Index, Record
+
+MAX_PAGE = 500
+_KEY_MAX = chr(0x10FFFF)  # sorts after every real key
+_CHUNK = 64 * 1024  # characters per streamed chunk
+
+Entry = Tuple[Any, Any, str]  # (sort value, id tiebreak, key)
+
+
+def id_sort_value(key: str) -> Tuple[int, Any]:
+    """Numeric ids in numeric order, then anything else alphabetically."""
+    return (0, int(key)) if key.isdigit() else (1, key)
+
+def text_sort_value(field: str) -> Callable[[Record], Any]:
+    def value(rec: Record) -> Any:
+        v = rec.get(field)
+        return "" if v is None else str(v).lower()
+    return value
+
+
+class SortedIndex(Index):
+    """Collection kept sorted by `value(record)`, ties broken by id."""
+
+    def __init__(self, value: Optional[Callable[[Record], Any]] = None) -> None:
+        self._value = value
+        self._entries: List[Entry] = []
+        self._by_key: Dict[str, Entry] = {}
+        self._records: Dict[str, Record] = {}
+
+    def _entry(self, rec: Record) -> Entry:
+        key = self.store.key_of(rec)
+        tie = id_sort_value(key)
+        return (self._value(rec) if self._value else tie, tie, key)
+
+    def rebuild(self, records: List[Record]) -> None:
+        self._records = {self.store.key_of(r): r for r in records}
+        self._by_key = {k: self._entry(r) for k, r in self._records.items()}
+        self._entries = sorted(self._by_key.values())
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        if old is not None:
+            key = self.store.key_of(old)
+            entry = self._by_key.pop(key, None)
+            self._records.pop(key, None)
+            if entry is not None:
+                i = bisect_left(self._entries, entry)
+                if i < len(self._entries) and self._entries[i] == entry:
+                    del self._entries[i]
+        if new is not None:
+            entry = self._entry(new)
+            self._by_key[entry[2]] = entry
+            self._records[entry[2]] = new
+            insort(self._entries, entry)
+
+    def walk(self, after: Optional[Sequence[Any]] = None, descending: bool = False) -> Iterator[Tuple[Entry, Record]]:
+        """
+        (entry, record) in sort order, starting just past `after`. The start
+        is found right away, so an `after` that can't be compared with the
+        sort values raises TypeError here, not while the page is streaming.
+        """
+        self._sync()
+        entries = self._entries
+        if not descending:
+            i = 0 if after is None else bisect_right(entries, (after[0], after[1], _KEY_MAX))
+        else:
+            i = len(entries) - 1 if after is None else bisect_left(entries, (after[0], after[1], "")) - 1
+        return self._walk(entries, i, -1 if descending else 1)
+
+    def _walk(self, entries: List[Entry], i: int, step: int) -> Iterator[Tuple[Entry, Record]]:
+        while 0 <= i < len(entries):
+            entry = entries[i]
+            rec = self._records.get(entry[2])
+            if rec is not None:
+                yield entry, rec
+            i += step
+
+
+# ========= Cursors / projection =========
+def _tupled(x: Any) -> Any:
+    return tuple(_tupled(v) for v in x) if isinstance(x, list) else x
+
+def encode_cursor(sort: str, entry: Entry) -> str:
+    raw = json.dumps({"s": sort, "v": entry[0], "t": entry[1]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if data["s"] != sort:
+            raise HTTPException(400, detail="Cursor does not match sort")
+        value, tie = _tupled(data["v"]), _tupled(data["t"])
+        # the tiebreak is always id_sort_value(): (0, int) or (1, str)
+        if not (isinstance(tie, tuple) and len(tie) == 2
+                and (tie[0], type(tie[1])) in ((0, int), (1, str)) and type(tie[0]) is int):
+            raise ValueError("bad tiebreak")
+        return (value, tie)
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(400, detail="Invalid cursor")
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    if not fields:
+        return None
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    if "id" not in names:
+        names.insert(0, "id")
+    return names
+
+def project(rec: Record, fields: Optional[List[str]]) -> Record:
+    if fields is None:
+        return rec
+    return {f: rec[f] for f in fields if f in rec}
+
+
+# ========= Streaming =========
+def stream_page(
+    items: Iterable[Record],
+    fields: Optional[List[str]] = None,
+    next_cursor: Optional[Callable[[], Optional[str]]] = None,
+) -> Iterator[bytes]:
+    """
+    Yield the JSON body in ~64 KiB chunks (each chunk is a threadpool hop for
+    StreamingResponse). `next_cursor`, if given, is called after the items
+    are exhausted and emitted as "next_cursor".
+    """
+    buf: List[str] = ['{"results":[']
+    size = 0
+    sep = ""
+    for rec in items:
+        chunk = sep + json.dumps(project(rec, fields), ensure_ascii=False)
+        sep = ","
+        buf.append(chunk)
+        size += len(chunk)
+        if size >= _CHUNK:
+            yield "".join(buf).encode("utf-8")
+            buf, size = [], 0
+    if next_cursor is None:
+        buf.append("]}")
+    else:
+        buf.append('],"next_cursor":' + json.dumps(next_cursor()) + "}")
+    yield "".join(buf).encode("utf-8")
+
+
+# ========= Page assembly =========
+def paginate(
+    sorts: Dict[str, SortedIndex],
+    sort: str,
+    limit: Optional[int],
+    cursor: Optional[str],
+    visible: Callable[[Record], bool],
+) -> Tuple[Iterator[Record], Callable[[], Optional[str]]]:
+    """
+    Resolve sort/cursor up front (so bad input is a 400, not a broken stream)
+    and return (lazy page items, next_cursor callback for stream_page()).
+    `sort` is a key of `sorts`, optionally prefixed with "-" for descending.
+    """
+    name, descending = sort.lstrip("-"), sort.startswith("-")
+    index = sorts.get(name)
+    if index is None:
+        raise HTTPException(400, detail=f"Unknown sort; use one of: {', '.join(sorts)}")
+    if limit is not None and limit < 1:
+        raise HTTPException(400, detail="limit must be positive")
+    limit = min(limit, MAX_PAGE) if limit is not None else None
+    after = decode_cursor(cursor, sort) if cursor else None
+    try:
+        walk = index.walk(after, descending)
+    except TypeError:
+        # well-formed, but its value isn't of this sort's type
+        raise HTTPException(400, detail="Invalid cursor")
+    state: Dict[str, Any] = {"last": None, "more": False}
+
+    def items() -> Iterator[Record]:
+        taken = 0
+        for entry, rec in walk:
+            if not visible(rec):
+                continue
+            if limit is not None and taken == limit:
+                state["more"] = True
+                return
+            state["last"] = entry
+            taken += 1
+            yield rec
+
+    def next_cursor() -> Optional[str]:
+        return encode_cursor(sort, state["last"]) if state["more"] else None
+
+    return items(), next_cursor
@@ -0,0 +1,146 @@
+"""
+Agent roster helpers for the login hot path.
+
+UsernameIndex maps the lowercased, stripped username to the agent keys that
+carry it, so login is one dict lookup instead of a scan of the roster.
+
+ActivityTracker takes the `lastActive` bump off the request: login records
+the timestamp in memory and a background thread writes the pending ones to
+the agents store every ARCHIVE_ACTIVITY_FLUSH seconds (and once more at
+shutdown). Several logins by the same agent between flushes cost one write.
+ARCHIVE_ACTIVITY_FLUSH=0 writes each bump through immediately instead.
+Reads that show agents overlay the pending value, so nothing looks stale.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from typing import Dict, List, Optional
+
+from store import Index, Record, Store
+
+ACTIVITY_FLUSH_SECONDS = float(os.getenv("ARCHIVE_ACTIVITY_FLUSH", "30"))
+
+
+def fold_username(username: Optional[str]) -> str:
+    return (username or "").strip().lower()
+
+
+class UsernameIndex(Index):
+    """folded username -> agent keys, in roster order."""
+
+    def __init__(self) -> None:
+        self._keys: Dict[str, List[str]] = {}
+
+    def rebuild(self, records: List[Record]) -> None:
+        self._keys = {}
+        for rec in records:
+            self._add(rec)
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        if old is not None:
+            name = fold_username(old.get("username"))
+            keys = self._keys.get(name)
+            if keys is not None:
+                key = self.store.key_of(old)
+                if key in keys:
+                    keys.remove(key)
+                if not keys:
+                    del self._keys[name]
+        if new is not None:
+            self._add(new)
+
+    def _add(self, rec: Record) -> None:
+        name = fold_username(rec.get("username"))
+        if name:
+            self._keys.setdefault(name, []).append(self.store.key_of(rec))
+
+    def lookup(self, username: str) -> List[Record]:
+        """Agents whose username matches case-insensitively."""
+        self._sync()
+        keys = self._keys.get(fold_username(username), ())
+        return [rec for rec in (self.store.get(k) for k in keys) if rec is not None]
+
+
+class ActivityTracker:
+    """Coalesces `lastActive` bumps and writes them to `store` in batches."""
+
+    def __init__(self, store: Store, field: str = "lastActive", interval: float = ACTIVITY_FLUSH_SECONDS) -> None:
+        self.store = store
+        self.field = field
+        self.interval = interval
+        self._pending: Dict[str, str] = {}
+        self.version = 0  # bumped whenever overlay() output may change
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def touch(self, key: str, when: str) -> None:
+        with self._lock:
+            if when > self._pending.get(key, ""):
+                self._pending[key] = when
+                self.version += 1
+        if self.interval <= 0:
+            self.flush()
+
+    def forget(self, key: str) -> None:
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def overlay(self, rec: Record) -> Record:
+        """`rec` with its pending timestamp applied (a copy if one is pending)."""
+        with self._lock:
+            when = self._pending.get(self.store.key_of(rec))
+        if when is None or when <= str(rec.get(self.field) or ""):
+            return rec
+        return {**rec, self.field: when}
+
+    def flush(self) -> int:
+        """
+        Write pending timestamps in one commit; returns how many records were
+        updated. Entries stay pending until the commit succeeds, so a failed
+        flush is retried by the next one.
+        """
+        with self._lock:
+            pending = dict(self._pending)
+        if not pending:
+            return 0
+        written = 0
+        with self.store.writing():
+            for key, when in pending.items():
+                rec = self.store.get(key)
+                # an edit since the login may already carry a newer value
+                if rec is None or when <= str(rec.get(self.field) or ""):
+                    continue
+                if self.store.patch(key, {self.field: when}) is not None:
+                    written += 1
+        with self._lock:
+            for key, when in pending.items():
+                # a login during the flush leaves a newer value to write next time
+                if self._pending.get(key) == when:
+                    del self._pending[key]
+        return written
+
+    # ---- background loop ----
+    def start(self) -> None:
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="activity-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the background loop and write whatever is still pending."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                # still pending; the next tick (or stop()) tries again
+                continue
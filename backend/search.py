@@ -0,0 +1,293 @@
+"""
+Search indexes for /api/search and /api/intel/search.
+
+PersonSearchIndex keeps, per person, the lowercased text of the fields that
+/api/search has always matched on, plus trigram postings over it: a query of
+3+ characters only verifies the records that contain every trigram of it, so
+results are the same substring matches as before without touching every
+record. 1-2 character queries have no trigram to narrow by and scan the
+prepared texts (still substring matches). Results come back in archive order.
+
+IntelTextIndex is a ranked full-text index over intel reports: term ->
+{key: term frequency} postings plus per-report lengths, scored with BM25
+(title terms count double). Only postings of keys the caller may see are
+scored, the best k come off a heap, and each hit gets a snippet of the
+field that matched best with the matched words' offsets.
+"""
+from __future__ import annotations
+
+import heapq
+import math
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from store import Index, Record
+
+_SEP = "\x00"  # between fields, so a match never spans two of them
+
+
+def person_search_fields(person: Record) -> List[Any]:
+    """Fields /api/search matches against."""
+    return [
+        str(person.get("id", "")),
+        person.get("full_name", ""),
+        *(person.get("known_aliases", []) or []),
+        person.get("dob", ""),
+        person.get("gender", ""),
+        person.get("nationality", ""),
+        person.get("current_address", ""),
+        person.get("gang_affiliation", ""),
+        *(person.get("known_associates", []) or []),
+        *(person.get("organization_ties", []) or []),
+        *(person.get("recent_contacts", []) or []),
+        person.get("suspected_informant", ""),
+        person.get("blackmail_material", ""),
+        person.get("created_by", ""),
+        person.get("access_level", ""),
+        *(person.get("internal_flags", []) or []),
+    ]
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2) if _SEP not in text[i:i + 3]}
+
+
+class PersonSearchIndex(Index):
+    """Incremental substring index over person_search_fields()."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()  # writers update while searches read
+        self._clear()
+
+    def _clear(self) -> None:
+        self._text: Dict[str, str] = {}
+        self._records: Dict[str, Record] = {}
+        self._order: Dict[str, int] = {}
+        self._seq = 0
+        self._grams: Dict[str, Set[str]] = {}
+
+    # ---- maintenance ----
+    def rebuild(self, records: List[Record]) -> None:
+        with self._lock:
+            self._clear()
+            for rec in records:
+                self._add(rec)
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        with self._lock:
+            order = None
+            if old is not None:
+                order = self._order.get(self.store.key_of(old))
+                self._remove(old)
+            if new is not None:
+                self._add(new, order)
+
+    def _add(self, rec: Record, order: Optional[int] = None) -> None:
+        key = self.store.key_of(rec)
+        if key in self._text:
+            self._remove(self._records[key])
+        text = _SEP.join(str(x).lower() for x in person_search_fields(rec))
+        self._text[key] = text
+        self._records[key] = rec
+        if order is None:
+            self._seq += 1
+            order = self._seq
+        self._order[key] = order
+        for g in _trigrams(text):
+            self._grams.setdefault(g, set()).add(key)
+
+    def _remove(self, rec: Record) -> None:
+        key = self.store.key_of(rec)
+        text = self._text.pop(key, None)
+        if text is None:
+            return
+        self._records.pop(key, None)
+        self._order.pop(key, None)
+        for g in _trigrams(text):
+            keys = self._grams.get(g)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._grams[g]
+
+    # ---- queries ----
+    def _substring_keys(self, q: str, within: Optional[Set[str]], stats: Dict[str, int]) -> Iterable[str]:
+        postings = sorted((self._grams.get(g, set()) for g in _trigrams(q)), key=len)
+        if not postings or not postings[0]:
+            return ()
+        candidates = set(postings[0]) if within is None else postings[0] & within
+        for p in postings[1:]:
+            if not candidates:
+                return ()
+            candidates &= p
+        stats["scanned"] = len(candidates)
+        return [k for k in candidates if q in self._text.get(k, "")]
+
+    def search(self, query: str, within: Optional[Set[str]] = None, stats: Optional[Dict[str, int]] = None) -> List[Record]:
+        """
+        People whose fields contain `query` (case-insensitive substring).
+        `within` restricts the candidates (e.g. to the caller's visible keys)
+        before any text is verified. `stats["scanned"]` gets the number of
+        records whose text was checked.
+        """
+        self._sync()
+        stats = {} if stats is None else stats
+        stats["scanned"] = 0
+        q = query.strip().lower()
+        if not q:
+            return []
+        # `within` belongs to another index and changes under writers too: one
+        # C-level copy (or set operation) reads it, never a Python loop
+        with self._lock:
+            if len(q) >= 3:
+                keys = self._substring_keys(q, within, stats)
+            else:
+                # no trigram to narrow by: check every candidate's prepared text
+                pool = list(self._text) if within is None else list(within)
+                keys = [k for k in pool if q in self._text.get(k, "")]
+                stats["scanned"] = len(pool)
+            ordered = sorted(keys, key=lambda k: self._order.get(k, 0))
+            return [self._records[k] for k in ordered if k in self._records]
+
+
+# ========= Intel full text =========
+INTEL_TEXT_FIELDS = ("title", "summary", "operation_code", "source", "collection_method",
+                     "linked_organizations", "linked_operations")
+_FIELD_WEIGHT = {"title": 2}
+_WORD = re.compile(r"\w+")
+_SNIPPET = 160  # characters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _field_text(rec: Record, field: str) -> str:
+    value = rec.get(field)
+    if isinstance(value, list):
+        return " · ".join(str(v) for v in value if v is not None)
+    return "" if value is None else str(value)
+
+def text_terms(text: str) -> List[str]:
+    return [w.lower() for w in _WORD.findall(text)]
+
+
+class IntelTextIndex(Index):
+    """BM25-ranked term postings over INTEL_TEXT_FIELDS."""
+
+    def __init__(self, fields: Iterable[str] = INTEL_TEXT_FIELDS) -> None:
+        self.fields = tuple(fields)
+        self._lock = threading.Lock()  # writers update while searches score
+        self._clear()
+
+    def _clear(self) -> None:
+        self._postings: Dict[str, Dict[str, int]] = {}
+        self._lengths: Dict[str, int] = {}
+        self._records: Dict[str, Record] = {}
+        self._total = 0
+
+    # ---- maintenance ----
+    def rebuild(self, records: List[Record]) -> None:
+        with self._lock:
+            self._clear()
+            for rec in records:
+                self._add(rec)
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        with self._lock:
+            if old is not None:
+                self._remove(self.store.key_of(old))
+            if new is not None:
+                self._add(new)
+
+    def _counts(self, rec: Record) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for field in self.fields:
+            weight = _FIELD_WEIGHT.get(field, 1)
+            for term in text_terms(_field_text(rec, field)):
+                counts[term] = counts.get(term, 0) + weight
+        return counts
+
+    def _add(self, rec: Record) -> None:
+        key = self.store.key_of(rec)
+        self._remove(key)
+        counts = self._counts(rec)
+        for term, tf in counts.items():
+            self._postings.setdefault(term, {})[key] = tf
+        self._lengths[key] = sum(counts.values())
+        self._total += self._lengths[key]
+        self._records[key] = rec
+
+    def _remove(self, key: str) -> None:
+        rec = self._records.pop(key, None)
+        if rec is None:
+            return
+        self._total -= self._lengths.pop(key, 0)
+        for term in self._counts(rec):
+            docs = self._postings.get(term)
+            if docs is not None:
+                docs.pop(key, None)
+                if not docs:
+                    del self._postings[term]
+
+    # ---- queries ----
+    def search(
+        self,
+        query: str,
+        within: Optional[Set[str]] = None,
+        k: int = 20,
+        stats: Optional[Dict[str, int]] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Top `k` reports for `query` as {"score", "record", "field", "snippet",
+        "highlights": [[start, end], ...]}. `within` limits scoring to those
+        keys; `stats["scanned"]` gets the number of reports scored.
+        """
+        self._sync()
+        stats = {} if stats is None else stats
+        stats["scanned"] = 0
+        terms = list(dict.fromkeys(text_terms(query)))
+        with self._lock:
+            n = len(self._lengths)
+            if not terms or not n:
+                return []
+            avg = self._total / n or 1.0
+            scores: Dict[str, float] = {}
+            for term in terms:
+                docs = self._postings.get(term)
+                if not docs:
+                    continue
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for key, tf in docs.items():
+                    if within is not None and key not in within:
+                        continue
+                    norm = BM25_K1 * (1 - BM25_B + BM25_B * self._lengths[key] / avg)
+                    scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1) / (tf + norm)
+            stats["scanned"] = len(scores)
+            best = [(self._records[key], score)
+                    for key, score in heapq.nlargest(k, scores.items(), key=lambda item: (item[1], item[0]))]
+        hits = []
+        for rec, score in best:
+            field, snippet, highlights = self._snippet(rec, set(terms))
+            hits.append({"score": round(score, 4), "record": rec, "field": field,
+                         "snippet": snippet, "highlights": highlights})
+        return hits
+
+    def _snippet(self, rec: Record, terms: Set[str]) -> Tuple[Optional[str], str, List[List[int]]]:
+        """The field with the most matched words, cut to a window around them."""
+        best: Tuple[int, Optional[str], str, List[Tuple[int, int]]] = (0, None, "", [])
+        for field in self.fields:
+            text = _field_text(rec, field)
+            spans = [(m.start(), m.end()) for m in _WORD.finditer(text) if m.group().lower() in terms]
+            if len(spans) > best[0]:
+                best = (len(spans), field, text, spans)
+        _, field, text, spans = best
+        if not spans:
+            return None, "", []
+        start = max(0, spans[0][0] - _SNIPPET // 4)
+        end = min(len(text), start + _SNIPPET)
+        if start > 0:
+            start = text.find(" ", start, spans[0][0]) + 1 or start
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if end < len(text) else ""
+        offset = len(prefix) - start
+        highlights = [[s + offset, e + offset] for s, e in spans if s >= start and e <= end]
+        return field, prefix + text[start:end] + suffix, highlights
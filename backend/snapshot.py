@@ -0,0 +1,150 @@
+"""
+Binary companion snapshots for JSON collections (ARCHIVE_SNAPSHOT=binary).
+
+The JSON files stay the source of truth and the interchange/export format;
+`<name>.snap` is a derived copy of one JSON snapshot that is cheaper to
+open. Layout (little-endian):
+
+    header   magic "ARCHSNAP", format version, marshal version, Python
+             major/minor, the JSON file's (mtime_ns, size) it was built from,
+             record count, offset + length of the keys blob
+    table    count x (u64 offset, u32 length), one per record
+    records  one marshal blob per record
+    keys     one marshal blob: the record keys, in archive order
+
+A reader mmaps the file, checks the header against the JSON file's current
+stat and this interpreter, and decodes only the keys up front. The journal
+is replayed over those, and then just the records it left standing are
+decoded, so a record superseded by the journal is never decoded at all. Any
+mismatch (hand edit, other Python, torn write) or a record that won't decode
+just means "not usable": callers fall back to the JSON file.
+
+marshal is only safe on files we wrote ourselves; the .snap lives next to
+the JSON it mirrors and is trusted exactly as much.
+"""
+from __future__ import annotations
+
+import gc
+import marshal
+import mmap
+import os
+import struct
+import sys
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import STORE_LOAD, STORE_SAVE, STORE_SAVE_BYTES
+
+Record = Dict[str, Any]
+
+MAGIC = b"ARCHSNAP"
+FORMAT_VERSION = 1
+_HEADER = struct.Struct("<8sHHBBxxqqQQQ")
+_ENTRY = struct.Struct("<QI")
+
+
+def snapshot_path(json_path: Path) -> Path:
+    return json_path.with_suffix(".snap")
+
+def _interned(value: Any) -> Any:
+    # interned dict keys are written once as such and shared by every decoded record
+    if isinstance(value, dict):
+        return {sys.intern(k) if isinstance(k, str) else k: _interned(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_interned(v) for v in value]
+    return value
+
+
+def write_snapshot(path: Path, records: List[Record], keys: List[str], source: Tuple[int, int]) -> int:
+    """Write `records` (the JSON file whose stat is `source`) to `path`; returns bytes written."""
+    with STORE_SAVE.time(path.name):
+        blobs = [marshal.dumps(_interned(rec)) for rec in records]
+        key_blob = marshal.dumps(list(keys))
+        offset = _HEADER.size + _ENTRY.size * len(blobs)
+        table = bytearray()
+        for blob in blobs:
+            table += _ENTRY.pack(offset, len(blob))
+            offset += len(blob)
+        header = _HEADER.pack(MAGIC, FORMAT_VERSION, marshal.version, sys.version_info[0], sys.version_info[1],
+                              source[0], source[1], len(blobs), offset, len(key_blob))
+        tmp = path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp.open("wb") as f:
+            f.write(header)
+            f.write(table)
+            for blob in blobs:
+                f.write(blob)
+            f.write(key_blob)
+            size = f.tell()
+        tmp.replace(path)
+    STORE_SAVE_BYTES.inc(path.name, amount=size)
+    return size
+
+
+class Snapshot:
+    """A mapped .snap file: keys up front, records decoded on access."""
+
+    def __init__(self, mm: mmap.mmap, count: int, keys: List[str]) -> None:
+        self._mm = mm
+        self.count = count
+        self.keys = keys
+
+    @classmethod
+    def open(cls, path: Path, source: Optional[Tuple[int, int]]) -> Optional["Snapshot"]:
+        """The snapshot at `path` if it was built from a JSON file with stat `source`, else None."""
+        if source is None:
+            return None
+        try:
+            with path.open("rb") as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (FileNotFoundError, ValueError, OSError):
+            return None
+        try:
+            with STORE_LOAD.time(path.name):
+                if len(mm) < _HEADER.size:
+                    raise ValueError("short header")
+                magic, fmt, marshal_version, major, minor, mtime_ns, size, count, keys_at, keys_len = _HEADER.unpack_from(mm, 0)
+                if (magic != MAGIC or fmt != FORMAT_VERSION or marshal_version != marshal.version
+                        or (major, minor) != sys.version_info[:2] or (mtime_ns, size) != tuple(source)
+                        or keys_at + keys_len != len(mm)):
+                    raise ValueError("stale or foreign snapshot")
+                keys = marshal.loads(mm[keys_at:keys_at + keys_len])
+                if not isinstance(keys, list) or len(keys) != count:
+                    raise ValueError("bad key table")
+        except (ValueError, EOFError, TypeError, struct.error):
+            mm.close()
+            return None
+        return cls(mm, count, keys)
+
+    def record(self, i: int) -> Record:
+        """Record `i`; ValueError if its entry or blob is damaged."""
+        try:
+            offset, length = _ENTRY.unpack_from(self._mm, _HEADER.size + _ENTRY.size * i)
+            rec = marshal.loads(self._mm[offset:offset + length])
+        except (ValueError, EOFError, TypeError, struct.error) as exc:
+            raise ValueError(f"record {i} unreadable: {exc}") from exc
+        if not isinstance(rec, dict):
+            raise ValueError(f"record {i} is not an object")
+        return rec
+
+    def records(self, picks: List[Any]) -> List[Record]:
+        """
+        Decode the positions in `picks`; anything that isn't an int passes
+        through. ValueError if any of them is damaged.
+        """
+        # the cyclic GC would otherwise rescan the growing heap every few hundred dicts
+        paused = gc.isenabled()
+        gc.disable()
+        try:
+            return [self.record(p) if isinstance(p, int) else p for p in picks]
+        finally:
+            if paused:
+                gc.enable()
+
+    def close(self) -> None:
+        self._mm.close()
+
+    def __enter__(self) -> "Snapshot":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
@@ -0,0 +1,159 @@
+"""
+Embedded SQLite backend for the record store (ARCHIVE_STORAGE=sqlite).
+
+Each collection is one table holding the record as JSON under its key
+(normalized id); every query is answered from the in-memory working set and
+its indexes, so the table needs no other columns. The id counter lives in the
+`_seq` table, updated in the same transaction as the record. Every commit
+also bumps the collection's row in `_gen`; PRAGMA data_version (one number
+for the whole file) only says that some connection committed something, and
+then the collection re-reads its own generation, so a write to one table
+never reloads the others. A group commit (see store.py) is one transaction.
+
+One-shot import of the existing JSON files (journals included):
+    python sqlite_store.py migrate [path/to/archive.db]
+"""
+from __future__ import annotations
+
+import json
+import sqlite3
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from store import JsonCollection, KeyFunc, Record, SharedGeneration, Store, record_key
+
+
+def default_db_path(root: Path) -> Path:
+    return root / "archive.db"
+
+def _dumps(rec: Record) -> str:
+    return json.dumps(rec, ensure_ascii=False, separators=(",", ":"))
+
+
+class SqliteCollection(Store):
+    """One table in a shared SQLite database file."""
+
+    def __init__(
+        self,
+        db_path: Path,
+        table: str,
+        key: KeyFunc = record_key,
+        shared: Optional[SharedGeneration] = None,
+    ) -> None:
+        if not table.isidentifier():
+            raise ValueError(f"Bad table name: {table!r}")
+        super().__init__(key, shared)
+        self.db_path = db_path
+        self.table = table
+        self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._db_lock = threading.RLock()  # the connection's own lock, never held by readers
+        self._data_version: Optional[int] = None  # PRAGMA data_version when _gen was read
+        self._gen = 0  # this table's commit counter, as of _data_version or our own last commit
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")  # acknowledged writes survive power loss
+        with self._db:
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                " pos INTEGER PRIMARY KEY AUTOINCREMENT,"  # keeps file/insertion order
+                " key TEXT NOT NULL UNIQUE,"
+                " data TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE TABLE IF NOT EXISTS _seq (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            self._db.execute("CREATE TABLE IF NOT EXISTS _gen (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    # ---- backend hooks ----
+    def _signature(self) -> int:
+        with self._db_lock:
+            # data_version moves on any other connection's commit, to any table
+            version = self._db.execute("PRAGMA data_version").fetchone()[0]
+            if version != self._data_version:
+                self._data_version = version
+                row = self._db.execute("SELECT value FROM _gen WHERE name = ?", (self.table,)).fetchone()
+                self._gen = row[0] if row else 0
+            return self._gen
+
+    def _bump_gen(self) -> None:
+        """Inside the write transaction; our own commits don't move data_version for us."""
+        self._db.execute(
+            "INSERT INTO _gen (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (self.table,),
+        )
+        self._gen = self._db.execute("SELECT value FROM _gen WHERE name = ?", (self.table,)).fetchone()[0]
+
+    def _load(self) -> List[Record]:
+        with self._db_lock:
+            rows = self._db.execute(f"SELECT data FROM {self.table} ORDER BY pos").fetchall()
+            seq = self._db.execute("SELECT value FROM _seq WHERE name = ?", (self.table,)).fetchone()
+        if seq:
+            self._seq = max(self._seq, seq[0])
+        return [json.loads(data) for (data,) in rows]
+
+    def _save_seq(self, value: int) -> None:
+        self._db.execute(
+            "INSERT INTO _seq (name, value) VALUES (?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET value = max(value, excluded.value)",
+            (self.table, value),
+        )
+
+    def _persist(self, entry: Record) -> None:
+        self._persist_batch([entry])
+
+    def _persist_batch(self, entries: List[Record]) -> None:
+        with self._db_lock, self._db:
+            for entry in entries:
+                self._execute(entry)
+            self._bump_gen()
+
+    def _execute(self, entry: Record) -> None:
+        t = self.table
+        if entry["op"] == "del":
+            self._db.execute(f"DELETE FROM {t} WHERE key = ?", (entry["key"],))
+            return
+        rec = entry["rec"]
+        key = self._key(rec)
+        if key.isdigit():
+            self._save_seq(int(key))
+        values = (key, _dumps(rec))
+        cur = self._db.execute(f"UPDATE {t} SET key = ?, data = ? WHERE key = ?", (*values, entry["key"]))
+        if cur.rowcount == 0:
+            self._db.execute(f"INSERT INTO {t} (key, data) VALUES (?, ?)", values)
+
+    def _persist_all(self, records: List[Record]) -> None:
+        t = self.table
+        with self._db_lock, self._db:
+            self._db.execute(f"DELETE FROM {t}")
+            self._save_seq(self._seq)
+            self._db.executemany(
+                f"INSERT OR REPLACE INTO {t} (key, data) VALUES (?, ?)",
+                ((self._key(r), _dumps(r)) for r in records),
+            )
+            self._bump_gen()
+
+
+# ========= One-shot migration =========
+def migrate(db_path: Path, sources: Dict[str, Path]) -> Dict[str, int]:
+    """Import each JSON snapshot (+ journal) into its table, replacing what was there."""
+    counts: Dict[str, int] = {}
+    for table, path in sources.items():
+        src = JsonCollection(path)
+        records = list(src.records())
+        dst = SqliteCollection(db_path, table)
+        dst._seq = max(dst._seq, src._seq)  # carry over ids freed by deletes
+        dst.save(records)
+        counts[table] = len(records)
+    return counts
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        sys.exit("usage: python sqlite_store.py migrate [path/to/archive.db]")
+    root = Path(__file__).parent
+    db = Path(sys.argv[2]) if len(sys.argv) > 2 else default_db_path(root)
+    done = migrate(db, {
+        "agents": root / "agents.json",
+        "people": root / "people.json",
+        "intel": root / "inteldata.json",
+    })
+    for table, n in done.items():
+        print(f"{table}: {n} records -> {db}")
@@ -0,0 +1,810 @@
+"""
+Record storage for the archive's collections (people, intel, agents).
+
+Every endpoint goes through a Store. The base class keeps the working set in
+memory and applies put/delete entries to it; subclasses only decide how those
+entries reach durable storage and how to notice that someone else changed it:
+
+- JsonCollection: the JSON snapshot files plus an append-only journal
+- SqliteCollection (sqlite_store.py): one table per collection with indexed columns
+
+Pick one at startup with ARCHIVE_STORAGE=json|sqlite (see open_collection()).
+
+JSON mode details: a cheap os.stat() on read notices hand edits (mtime or size
+changed) and triggers a reload. Every put/delete is appended as one compact
+JSON line to `<name>.journal` next to the snapshot and fsync'd before the call
+returns. On load the journal is replayed over the snapshot; once it grows past
+`compact_every` entries (and at shutdown) the snapshot is rewritten and the
+journal truncated, only once the new snapshot and its directory entry are
+fsync'd. Replay is idempotent, so a crash mid-compaction is safe.
+Set ARCHIVE_JOURNAL=0 to rewrite the snapshot on every write instead.
+ARCHIVE_SNAPSHOT=binary also keeps a `<name>.snap` beside each snapshot
+(see snapshot.py) and starts from it while it matches the JSON file.
+
+Concurrency: reads are lock-free against the in-memory working set and never
+wait for disk. A write takes the collection's write lock only long enough to
+apply the change in memory, then waits (lock released) for the group commit:
+the first waiter flushes every entry queued so far in one journal append and
+fsync (one transaction for SQLite), and the others ride along. Writers that
+arrive while a flush is running form the next batch; ARCHIVE_GROUP_COMMIT_MS
+additionally holds each batch open for that long. A write returns once it is
+durable. Read-modify-write sequences go under `with store.writing():`.
+
+Multi-worker mode (ARCHIVE_MULTI_WORKER=1, for `uvicorn --workers N`; POSIX
+only): every write block also holds an fcntl.flock() on `<name>.lock`,
+catches up with the other workers first and commits before letting go, so
+workers never interleave appends or lose each other's updates. After each
+commit the writer bumps an 8-byte generation counter in `<name>.gen`, which
+every worker keeps mmap'd: checking for another worker's change is one memory
+read, and only then does the worker refresh (for JSON, by replaying just the
+new journal lines). In this mode hand edits to the files are not noticed until
+the next write or restart.
+"""
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import Any, Callable, ContextManager, Dict, Iterator, List, Optional, Tuple
+
+from metrics import JOURNAL_APPEND, JOURNAL_BYTES, STORE_LOAD, STORE_SAVE, STORE_SAVE_BYTES
+from snapshot import Snapshot, snapshot_path, write_snapshot
+
+try:
+    import fcntl
+except ImportError:  # Windows: no multi-worker mode
+    fcntl = None  # type: ignore[assignment]
+
+Record = Dict[str, Any]
+KeyFunc = Callable[[Record], str]
+
+STORAGE_BACKEND = os.getenv("ARCHIVE_STORAGE", "json").strip().lower()
+JOURNAL_ENABLED = os.getenv("ARCHIVE_JOURNAL", "1") != "0"
+COMPACT_EVERY = int(os.getenv("ARCHIVE_COMPACT_EVERY", "1000"))
+GROUP_COMMIT_WINDOW = float(os.getenv("ARCHIVE_GROUP_COMMIT_MS", "0")) / 1000.0
+MULTI_WORKER = os.getenv("ARCHIVE_MULTI_WORKER", "0") == "1"
+BINARY_SNAPSHOT = os.getenv("ARCHIVE_SNAPSHOT", "json").strip().lower() == "binary"
+
+
+# ========= Raw JSON helpers =========
+def _ensure_file(path: Path, default: Any) -> None:
+    if not path.exists():
+        path.write_text(json.dumps(default, indent=2), encoding="utf-8")
+
+def _load_json(path: Path, default: Any) -> Any:
+    _ensure_file(path, default)
+    with STORE_LOAD.time(path.name), path.open("r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _save_json(path: Path, data: Any) -> None:
+    with STORE_SAVE.time(path.name):
+        raw = json.dumps(data, indent=2, ensure_ascii=False).encode("utf-8")
+        _replace_durably(path, path.with_suffix(".tmp.json"), raw)
+    STORE_SAVE_BYTES.inc(path.name, amount=len(raw))
+
+def _replace_durably(path: Path, tmp: Path, raw: bytes) -> None:
+    """
+    Write `raw` to `tmp`, fsync it, rename it over `path` and fsync the
+    directory: after a crash `path` holds either the old bytes or all of `raw`.
+    """
+    with tmp.open("wb") as f:
+        f.write(raw)
+        f.flush()
+        os.fsync(f.fileno())
+    tmp.replace(path)
+    _fsync_dir(path.parent)
+
+def _fsync_dir(path: Path) -> None:
+    # makes a rename/unlink in `path` durable; not possible (nor needed) on Windows
+    try:
+        fd = os.open(str(path), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+def _as_list(data: Any) -> List[Record]:
+    """Accept a plain list, the legacy {"results": [...]} wrapper, or an {id: record} mapping."""
+    if isinstance(data, dict):
+        if isinstance(data.get("results"), list):
+            return data["results"]
+        return list(data.values())
+    return data if isinstance(data, list) else []
+
+def normalize_id(x: Any) -> str:
+    """Normalize '001', '1', 1 -> '1' for comparisons."""
+    s = str(x).strip()
+    if s.isdigit():
+        return str(int(s))
+    return s
+
+def record_key(rec: Record) -> str:
+    return normalize_id(rec.get("id", ""))
+
+def _stat(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+@contextmanager
+def _stacked(*managers: ContextManager[Any]) -> Iterator[None]:
+    with ExitStack() as stack:
+        for m in managers:
+            stack.enter_context(m)
+        yield
+
+
+# ========= Storage interface =========
+class Index:
+    """
+    Derived lookup structure kept in step with a Store (see Store.attach()).
+    rebuild() receives the full record list after every (re)load; update()
+    receives (old, new) for each put/delete, with None for the missing side.
+    Query methods should call _sync() first so outside edits are picked up.
+    If update() raises, the write is refused and the indexes already updated
+    get update(new, old). Observers (change feeds) run after every other
+    index, so they only hear about writes the rest accepted.
+    """
+
+    store: Optional["Store"] = None
+    observer = False
+
+    def rebuild(self, records: List[Record]) -> None:
+        raise NotImplementedError
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        raise NotImplementedError
+
+    def _sync(self) -> None:
+        if self.store is not None:
+            self.store.records()
+
+
+class SharedGeneration:
+    """
+    Cross-process write lock and change counter for one collection:
+    flock() on `<base>.lock`, and a little-endian u64 in `<base>.gen` that
+    every process maps into memory.
+    """
+
+    def __init__(self, base: Path) -> None:
+        if fcntl is None:
+            raise RuntimeError("ARCHIVE_MULTI_WORKER needs fcntl (POSIX only)")
+        self._lock_file = base.with_suffix(".lock").open("a+b")
+        fd = os.open(str(base.with_suffix(".gen")), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            with self.locked():
+                if os.fstat(fd).st_size < 8:
+                    os.ftruncate(fd, 8)
+            self._mm = mmap.mmap(fd, 8)
+        finally:
+            os.close(fd)
+
+    @contextmanager
+    def locked(self) -> Iterator[None]:
+        fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_UN)
+
+    def value(self) -> int:
+        return struct.unpack_from("<Q", self._mm, 0)[0]
+
+    def bump(self) -> None:
+        """Call with locked() held, after the change is durable."""
+        struct.pack_into("<Q", self._mm, 0, self.value() + 1)
+
+
+class _Batch:
+    """Entries waiting for one group commit."""
+
+    def __init__(self) -> None:
+        self.entries: List[Record] = []
+        self.done = threading.Event()
+        self.error: Optional[BaseException] = None
+
+
+class Store:
+    """
+    In-memory working set over some durable storage.
+    - records(): cached list in archive order, reloaded only when _signature() changes
+    - get(): O(1) lookup by normalized id (hash index built once at load time)
+    - put()/delete()/patch(): single-record writes, group-committed
+    - writing(): hold the write lock across a read-modify-write
+    - atomic(): writing(), but a block that raises leaves nothing behind
+    - next_id(): monotonic numeric id counter, persisted with the data
+    - save(): replace the whole collection
+    - attach(): keep an Index up to date with every write and reload
+    - version(): opaque token that changes whenever the working set does
+    - generation(): the cross-worker commit counter (multi-worker mode only)
+    The returned lists and records are shared: copy before mutating.
+
+    Subclasses implement _load(), _signature(), _persist() (or
+    _persist_batch()) and _persist_all().
+    """
+
+    def __init__(self, key: KeyFunc = record_key, shared: Optional[SharedGeneration] = None) -> None:
+        self._key = key
+        self._shared = shared  # multi-worker coordination, if enabled
+        self._map: Optional[Dict[str, Record]] = None  # key -> record, archive order
+        self._list: Optional[List[Record]] = None  # snapshot of _map values; None after a write
+        self._seq = 0  # highest numeric id seen or issued
+        self._sig: Any = None
+        self._lock = threading.RLock()  # write lock; readers never take it unless reloading
+        self._io_lock = threading.RLock()  # one flush/compaction at a time
+        self._batch = _Batch()  # open batch, applied in memory but not yet durable
+        self._io_pending = 0  # own writes not yet reflected in _sig
+        self._local = threading.local()
+        self._indexes: List[Index] = []
+        self._epoch = os.urandom(4).hex()  # keeps version() unique across restarts
+        self._changes = 0  # bumped on every in-memory change
+
+    # ---- backend hooks ----
+    def _load(self) -> List[Record]:
+        """Read every record; may also raise self._seq from a persisted counter."""
+        raise NotImplementedError
+
+    def _signature(self) -> Any:
+        """Changes whenever another writer touched the durable copy."""
+        raise NotImplementedError
+
+    def _persist(self, entry: Record) -> None:
+        """Make one put/del entry durable."""
+        raise NotImplementedError
+
+    def _persist_batch(self, entries: List[Record]) -> None:
+        """Make a group of entries durable, in order. Override to share one flush."""
+        for entry in entries:
+            self._persist(entry)
+
+    def _persist_all(self, records: List[Record]) -> None:
+        """Replace the durable copy, including the id counter."""
+        raise NotImplementedError
+
+    def _catch_up(self) -> Optional[List[Record]]:
+        """
+        Entries written by someone else since our last load/write, if the
+        backend can tell; None means reload everything.
+        """
+        return None
+
+    def _after_write(self) -> None:
+        """Hook for backend housekeeping once a write is applied."""
+
+    def compact(self) -> None:
+        """Backend housekeeping (e.g. fold a journal); called at shutdown."""
+
+    # ---- in-memory application ----
+    def _bump_seq(self, key: str) -> None:
+        if key.isdigit() and int(key) > self._seq:
+            self._seq = int(key)
+
+    def _apply(self, mapping: Dict[str, Record], entry: Record) -> Optional[Record]:
+        """Apply one put/del entry in memory; returns the record it replaced/removed."""
+        op = entry.get("op")
+        key = entry.get("key")
+        if op == "put":
+            rec = entry["rec"]
+            new_key = self._key(rec)
+            self._bump_seq(new_key)
+            slot = key if key in mapping else new_key
+            old = mapping.get(slot)
+            if slot == new_key:
+                mapping[new_key] = rec
+            else:
+                # id changed: rename the slot in place so archive order is kept
+                items = [(new_key, rec) if k == slot else (k, r) for k, r in mapping.items() if k != new_key]
+                mapping.clear()
+                mapping.update(items)
+            return old
+        if op == "del":
+            return mapping.pop(key, None)
+        return None
+
+    def _version(self) -> Any:
+        """Cheap change token: the shared generation in multi-worker mode, else _signature()."""
+        return self._shared.value() if self._shared is not None else self._signature()
+
+    def _fresh(self) -> Dict[str, Record]:
+        # while our own flush is pending the durable copy is expected to differ
+        mapping = self._map
+        if mapping is not None and (self._io_pending or self._version() == self._sig):
+            return mapping
+        with self._lock:
+            if self._map is None or not self._io_pending:
+                # read first: a commit that lands while we read is noticed next time
+                seen = self._version()
+                if self._map is None:
+                    self._reset(self._load_whole())
+                    self._sig = seen
+                elif seen != self._sig:
+                    entries = self._catch_up()
+                    if entries is None:
+                        self._reset(self._load_whole())
+                    else:
+                        for entry in entries:
+                            self._apply_live(entry)
+                    self._sig = seen
+            return self._map
+
+    def _load_whole(self) -> List[Record]:
+        # another worker's commit is either all in the load or not yet bumped into
+        # the generation; never half of it (we may already hold the lock in writing())
+        if self._shared is None or getattr(self._local, "depth", 0):
+            return self._load()
+        with self._shared.locked():
+            return self._load()
+
+    def _apply_live(self, entry: Record) -> Optional[Record]:
+        """
+        Apply an entry to the indexes, then to the working set readers see.
+        If an index rejects it, the indexes are put back and the working set
+        is left untouched, so nothing of the entry remains.
+        """
+        mapping = self._map
+        key = entry["key"]
+        new = entry["rec"] if entry["op"] == "put" else None
+        slot = key if new is None or key in mapping else self._key(new)
+        old = mapping.get(slot)
+        self._update_indexes(old, new)
+        if new is not None and key in mapping and key != self._key(new):
+            mapping = dict(mapping)  # a rename reorders: swap in a new dict, never edit the live one
+        self._apply(mapping, entry)
+        self._map = mapping
+        self._list = None
+        self._changes += 1
+        return old
+
+    def _update_indexes(self, old: Optional[Record], new: Optional[Record]) -> None:
+        done: List[Index] = []
+        try:
+            for index in self._indexes:
+                index.update(old, new)
+                done.append(index)
+        except BaseException:
+            try:
+                for index in reversed(done):
+                    index.update(new, old)
+                # the failing one may be half-updated; the working set is still as before
+                self._indexes[len(done)].rebuild(self.records())
+            except BaseException:
+                self.invalidate()
+            raise
+
+    def _write(self, entry: Record) -> Optional[Record]:
+        with self.writing():
+            mapping = self._fresh()
+            if entry["op"] == "del" and entry["key"] not in mapping:
+                return None
+            old = self._apply_live(entry)
+            undo = getattr(self._local, "undo", None)
+            if undo is not None:
+                undo.append((entry, old))
+            self._batch.entries.append(entry)
+            self._io_pending += 1
+            self._local.ticket = self._batch
+            return old
+
+    # ---- group commit ----
+    def _commit(self, batch: _Batch) -> None:
+        """Wait until `batch` is durable, flushing it ourselves if nobody has yet."""
+        if GROUP_COMMIT_WINDOW > 0 and self._shared is None and not batch.done.is_set():
+            time.sleep(GROUP_COMMIT_WINDOW)
+        with self._io_lock:
+            if not batch.done.is_set():
+                # batches close in order under _io_lock, so this is the open one
+                with self._lock:
+                    self._batch = _Batch()
+                self._flush(batch)
+        if batch.error is not None:
+            raise batch.error
+
+    def _flush(self, batch: _Batch) -> None:
+        try:
+            self._persist_batch(batch.entries)
+            if self._shared is not None:
+                self._shared.bump()
+        except BaseException as exc:
+            batch.error = exc
+        with self._lock:
+            self._sig = self._version()
+            self._io_pending -= len(batch.entries)
+            if batch.error is not None:
+                # memory is ahead of storage: drop it and reload
+                self.invalidate()
+        batch.done.set()
+        if batch.error is None:
+            self._after_write()
+
+    @contextmanager
+    def writing(self) -> Iterator["Store"]:
+        """
+        Hold the collection's write lock, e.g. around get() + checks + put().
+        Readers are not blocked. Writes made inside become durable after the
+        lock is released, before the block exits. In multi-worker mode the
+        block also holds the cross-process lock and commits inside it.
+        """
+        local = self._local
+        depth = getattr(local, "depth", 0)
+        local.depth = depth + 1
+        try:
+            with self._lock:
+                if depth == 0 and self._shared is not None:
+                    with self._shared.locked():
+                        try:
+                            yield self
+                        finally:
+                            self._settle()
+                else:
+                    yield self
+        finally:
+            local.depth = depth
+            if depth == 0:
+                self._settle()
+
+    @contextmanager
+    def atomic(self) -> Iterator["Store"]:
+        """
+        writing(), all or nothing: if the block raises, every write made in it
+        is taken back out of the working set, the indexes and the pending
+        commit batch before the error propagates, so none of it is persisted.
+        Observers hear the reversal as ordinary updates.
+        """
+        with self.writing():
+            self._fresh()
+            saved = dict(self._map)
+            batch = self._batch  # can't be swapped for a new one while we hold the lock
+            mark = len(batch.entries)
+            outer = getattr(self._local, "undo", None)
+            undo: List[Tuple[Record, Optional[Record]]] = []
+            self._local.undo = undo
+            try:
+                yield self
+            except BaseException:
+                self._local.undo = outer
+                self._rollback(saved, batch, mark, undo)
+                raise
+            self._local.undo = outer
+            if outer is not None:
+                outer.extend(undo)
+
+    def _rollback(self, saved: Dict[str, Record], batch: _Batch, mark: int, undo: List[Tuple[Record, Optional[Record]]]) -> None:
+        try:
+            for entry, old in reversed(undo):
+                new = entry["rec"] if entry["op"] == "put" else None
+                for index in self._indexes:
+                    index.update(new, old)
+        except BaseException:
+            for index in self._indexes:
+                index.rebuild(list(saved.values()))
+        self._map = saved
+        self._list = None
+        self._changes += 1
+        self._io_pending -= len(batch.entries) - mark
+        del batch.entries[mark:]
+
+    def _settle(self) -> None:
+        ticket = getattr(self._local, "ticket", None)
+        if ticket is not None:
+            self._local.ticket = None
+            self._commit(ticket)
+
+    def _exclusive(self) -> ContextManager[Any]:
+        """No other writer, flush or (multi-worker) process until exit."""
+        if self._shared is not None:
+            # commits already run inside writing() here, so take the locks in that order
+            return _stacked(self.writing(), self._io_lock)
+        return _stacked(self._io_lock, self._lock)
+
+    def _reset(self, records: List[Record]) -> None:
+        mapping: Dict[str, Record] = {}
+        for rec in records:
+            key = self._key(rec)
+            self._bump_seq(key)
+            mapping[key] = rec
+        self._map = mapping
+        self._list = list(mapping.values())
+        self._changes += 1
+        self._sig = self._version()
+        for index in self._indexes:
+            index.rebuild(self._list)
+
+    # ---- public API ----
+    def records(self) -> List[Record]:
+        self._fresh()
+        snapshot = self._list
+        if snapshot is None:
+            with self._lock:
+                if self._list is None:
+                    self._list = list(self._map.values())
+                snapshot = self._list
+        return snapshot
+
+    def version(self) -> str:
+        """
+        Changes whenever the records do (a write here or a reload). In
+        multi-worker mode it is the shared generation, so every worker agrees.
+        """
+        self._fresh()
+        if self._shared is not None and not self._io_pending:
+            return f"g{self._sig}"
+        return f"{self._epoch}.{self._changes}"
+
+    def generation(self) -> Optional[int]:
+        """
+        The shared generation counter in multi-worker mode (None otherwise):
+        the same number in every worker, bumped after each durable commit.
+        """
+        return self._shared.value() if self._shared is not None else None
+
+    def key_of(self, record: Record) -> str:
+        return self._key(record)
+
+    def attach(self, index: Index) -> Index:
+        with self._lock:
+            index.store = self
+            if index.observer:
+                self._indexes.append(index)
+            else:
+                # derived indexes go before every observer
+                at = next((i for i, ix in enumerate(self._indexes) if ix.observer), len(self._indexes))
+                self._indexes.insert(at, index)
+            if self._map is not None:
+                index.rebuild(self.records())
+        return index
+
+    def get(self, key: str) -> Optional[Record]:
+        return self._fresh().get(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._fresh()
+
+    def next_id(self) -> int:
+        """Allocate the next numeric id. Ids are never reused, even after deletes."""
+        with self.writing():
+            self._fresh()
+            self._seq += 1
+            return self._seq
+
+    def put(self, record: Record, key: Optional[str] = None) -> Optional[Record]:
+        """
+        Insert or replace a record. `key` names the slot to replace when the
+        record's own id changed; defaults to the record's key.
+        Returns the replaced record, if any.
+        """
+        k = self._key(record) if key is None else key
+        return self._write({"op": "put", "key": k, "rec": record})
+
+    def patch(self, key: str, fields: Record) -> Optional[Record]:
+        """
+        Merge `fields` into the record with this key as one atomic
+        read-modify-write. Returns the new record, or None if absent.
+        """
+        with self.writing():
+            current = self._fresh().get(key)
+            if current is None:
+                return None
+            updated = {**current, **fields}
+            self._write({"op": "put", "key": key, "rec": updated})
+            return updated
+
+    def delete(self, key: str) -> Optional[Record]:
+        """Remove the record with this key; returns it, or None if absent."""
+        return self._write({"op": "del", "key": key})
+
+    def save(self, records: List[Record]) -> None:
+        with self._exclusive():
+            for rec in records:
+                self._bump_seq(self._key(rec))
+            self._persist_all(records)
+            if self._shared is not None:
+                self._shared.bump()
+            self._reset(records)
+
+    def invalidate(self) -> None:
+        """Drop the cached copy; next read goes back to storage."""
+        with self._lock:
+            self._map = None
+            self._list = None
+            self._sig = None
+
+
+# ========= JSON files + journal =========
+class JsonCollection(Store):
+    """
+    One JSON snapshot file plus its `<name>.journal` and `<name>.seq` id
+    counter, and with `binary` its `<name>.snap` fast-start copy.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        key: KeyFunc = record_key,
+        default: Any = None,
+        journal: bool = JOURNAL_ENABLED,
+        compact_every: int = COMPACT_EVERY,
+        shared: Optional[SharedGeneration] = None,
+        binary: bool = BINARY_SNAPSHOT,
+    ) -> None:
+        super().__init__(key, shared)
+        self.path = path
+        self.journal_path = path.with_suffix(".journal")
+        self.seq_path = path.with_suffix(".seq")
+        self.snap_path = snapshot_path(path)
+        self.default = [] if default is None else default
+        self._journal = journal
+        self._binary = binary
+        self._compact_every = compact_every
+        self._pending = 0  # journal lines since last compaction
+        self._snapshot_stat: Optional[Tuple[int, int]] = None  # snapshot as of our last load/write
+        self._offset = 0  # journal bytes already applied
+
+    def _signature(self) -> Tuple[Any, Any]:
+        return (_stat(self.path), _stat(self.journal_path))
+
+    def _load(self) -> List[Record]:
+        snap = Snapshot.open(self.snap_path, _stat(self.path)) if self._binary else None
+        if snap is not None:
+            with snap:
+                try:
+                    return self._load_from(snap)
+                except ValueError:
+                    pass  # a damaged record: start over from the JSON file, which rewrites the .snap
+        return self._load_from(None)
+
+    def _load_from(self, snap: Optional[Snapshot]) -> List[Record]:
+        if snap is None:
+            before = _stat(self.path)
+            records = _as_list(_load_json(self.path, self.default))
+            mapping: Dict[str, Any] = {self._key(r): r for r in records}
+            self._snapshot_stat = _stat(self.path)
+            if self._binary and self._snapshot_stat == before:
+                self._write_snap(records)
+        else:
+            # record positions for now; only what survives the journal gets decoded
+            mapping = dict(zip(snap.keys, range(snap.count)))
+            self._snapshot_stat = _stat(self.path)
+        try:
+            self._seq = max(self._seq, int(self.seq_path.read_text(encoding="utf-8").strip() or 0))
+        except (FileNotFoundError, ValueError):
+            pass
+        self._pending = 0
+        self._offset = 0
+        for entry in self._read_journal():
+            self._apply(mapping, entry)
+        if snap is None:
+            return list(mapping.values())
+        return snap.records(list(mapping.values()))
+
+    def _write_snap(self, records: List[Record]) -> None:
+        source = _stat(self.path)
+        if source is None:
+            return
+        try:
+            write_snapshot(self.snap_path, records, [self._key(r) for r in records], source)
+        except OSError:
+            pass  # only a cache: the next load reads the JSON instead
+
+    def _read_journal(self) -> List[Record]:
+        """Complete journal lines past self._offset; advances it."""
+        entries: List[Record] = []
+        try:
+            f = self.journal_path.open("rb")
+        except FileNotFoundError:
+            return entries
+        with f:
+            f.seek(self._offset)
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError
+                    entry = json.loads(line)
+                except ValueError:
+                    # torn tail from a crash mid-append: never acknowledged
+                    break
+                entries.append(entry)
+                self._offset += len(line)
+        self._pending += len(entries)
+        return entries
+
+    def _catch_up(self) -> Optional[List[Record]]:
+        # only appends since we last looked: replay just those lines
+        if self._snapshot_stat != _stat(self.path):
+            return None
+        journal = _stat(self.journal_path)
+        if journal is None or journal[1] < self._offset:
+            return None
+        return self._read_journal()
+
+    def _append(self, entries: List[Record]) -> None:
+        if not entries:
+            return
+        data = "".join(json.dumps(e, ensure_ascii=False, separators=(",", ":")) + "\n" for e in entries).encode("utf-8")
+        with JOURNAL_APPEND.time(self.journal_path.name), self.journal_path.open("ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        JOURNAL_BYTES.inc(self.journal_path.name, amount=len(data))
+        self._offset += len(data)
+        self._pending += len(entries)
+
+    def _persist(self, entry: Record) -> None:
+        self._persist_batch([entry])
+
+    def _persist_batch(self, entries: List[Record]) -> None:
+        if self._journal:
+            self._append(entries)
+        else:
+            # already applied in memory: the current working set is the new snapshot
+            self._persist_all(self.records())
+
+    def _persist_all(self, records: List[Record]) -> None:
+        # both durable before the journal that still backs them goes away
+        _replace_durably(self.seq_path, self.seq_path.with_suffix(".seq.tmp"), str(self._seq).encode("utf-8"))
+        _save_json(self.path, records)
+        if self.journal_path.exists():
+            self.journal_path.unlink()
+        self._snapshot_stat = _stat(self.path)
+        if self._binary:
+            self._write_snap(records)
+        self._offset = 0
+        self._pending = 0
+
+    def _after_write(self) -> None:
+        if self._journal and self._pending >= self._compact_every:
+            self.compact()
+
+    def compact(self) -> None:
+        """Fold the journal back into the snapshot file. Writers keep queueing meanwhile."""
+        if self._shared is not None:
+            # other workers append too: fold everything, with all of them held off
+            with self._exclusive():
+                self._fresh()
+                if self.journal_path.exists():
+                    self._persist_all(self.records())
+                    self._shared.bump()
+                    self._sig = self._version()
+            return
+        with self._io_lock:
+            with self._lock:
+                if self._map is None or not self.journal_path.exists():
+                    return
+                records = self.records()
+                self._io_pending += 1
+            try:
+                self._persist_all(records)
+            finally:
+                with self._lock:
+                    self._sig = self._version()
+                    self._io_pending -= 1
+
+
+# ========= Backend selection =========
+def open_collection(name: str, path: Path, default: Any = None, key: KeyFunc = record_key) -> Store:
+    """
+    Build the configured backend for one collection.
+    `path` is the JSON snapshot; the SQLite backend keeps all collections in
+    ARCHIVE_DB (default: archive.db next to the snapshots). Multi-worker lock
+    and generation files sit next to `path` either way.
+    """
+    shared = SharedGeneration(path) if MULTI_WORKER else None
+    if STORAGE_BACKEND == "sqlite":
+        from sqlite_store import SqliteCollection, default_db_path
+
+        db_path = Path(os.getenv("ARCHIVE_DB") or default_db_path(path.parent))
+        return SqliteCollection(db_path, name, key, shared=shared)
+    if STORAGE_BACKEND != "json":
+        raise ValueError(f"Unknown ARCHIVE_STORAGE backend: {STORAGE_BACKEND!r}")
+    return JsonCollection(path, key=key, default=default, shared=shared)
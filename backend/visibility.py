@@ -0,0 +1,64 @@
+"""
+Precomputed per-record clearance for ACL filtering.
+
+ClearanceIndex runs auth.record_required_clearance() once per record write
+and keeps, for every clearance tier, the set of record keys visible at that
+tier (cumulative: tier N includes everything up to N). Filtering for a caller
+is then a lookup of one set, and narrowing other key sets (search hits,
+high-priority items) to what the caller may see is a set intersection.
+"""
+from __future__ import annotations
+
+from typing import Any, Dict, List, Optional, Set
+
+from auth import CLEARANCE_ORDER, clearance_level, record_required_clearance
+from store import Index, Record
+
+_TIERS = len(CLEARANCE_ORDER)
+_NOTHING: Set[str] = frozenset()  # type: ignore[assignment]
+
+
+class ClearanceIndex(Index):
+    """key -> required tier, plus cumulative visible-key sets per tier."""
+
+    def __init__(self) -> None:
+        self._tier: Dict[str, int] = {}
+        self._visible: List[Set[str]] = [set() for _ in range(_TIERS)]
+
+    def rebuild(self, records: List[Record]) -> None:
+        self._tier = {}
+        self._visible = [set() for _ in range(_TIERS)]
+        for rec in records:
+            self._add(rec)
+
+    def update(self, old: Optional[Record], new: Optional[Record]) -> None:
+        if old is not None:
+            key = self.store.key_of(old)
+            tier = self._tier.pop(key, None)
+            if tier is not None:
+                for level in range(tier, _TIERS):
+                    self._visible[level].discard(key)
+        if new is not None:
+            self._add(new)
+
+    def _add(self, rec: Record) -> None:
+        key = self.store.key_of(rec)
+        tier = CLEARANCE_ORDER[record_required_clearance(rec)]
+        self._tier[key] = tier
+        for level in range(tier, _TIERS):
+            self._visible[level].add(key)
+
+    # ---- queries ----
+    def visible_keys(self, user: Optional[Dict[str, Any]]) -> Set[str]:
+        """Keys the caller may see. Shared set: do not mutate."""
+        self._sync()
+        level = clearance_level(user) if user else -1
+        if level < 0:
+            return _NOTHING
+        return self._visible[min(level, _TIERS - 1)]
+
+    def sees_everything(self, user: Optional[Dict[str, Any]]) -> bool:
+        return len(self.visible_keys(user)) == len(self._tier)
+
+    def can_view(self, user: Optional[Dict[str, Any]], rec: Record) -> bool:
+        return self.store.key_of(rec) in self.visible_keys(user)